@@ -1,11 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
 from jose import jwt, JWTError
+from datetime import datetime, timedelta
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.database.mongo import mongo_db
 from app.database.connection import SessionLocal
+from app.database.mongo import mongo_disponible
 from app.models.user import User
+from app.repositories import get_repository
 from app.services.auth_utils import SECRET_KEY, ALGORITHM
+from app.services.cache import respuesta_cacheada, respuesta_cacheada_async
+from app.services.export import stream_csv, stream_parquet
+from app.services.rate_limit import ingest_limiter
+from app.services.rollups import obtener_tendencia
+import asyncio
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -37,8 +47,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 
 # --- 1. DASHBOARD GLOBAL: FOTO ACTUAL DEL AULA ---
 @router.get("/global-stats")
-def get_global_stats(
-    db: Session = Depends(get_db), 
+async def get_global_stats(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
     # Si el docente no tiene NRC, retornamos vacío
@@ -50,47 +61,28 @@ def get_global_stats(
             "warning": "Docente sin NRC"
         }
 
-    # A. TOTAL INSCRITOS (SQL): ¿Cuántos alumnos hay en la lista oficial?
-    # Esto cuenta a todos (los que hicieron test y los que no)
-    total_enrolled = db.query(User).filter(
-        User.role == 'student',
-        User.nrc == current_user.nrc
-    ).count()
+    # Solo se recalcula si hubo evaluaciones nuevas en el NRC (o caducó la caché)
+    return await respuesta_cacheada_async(
+        request, response, ("global-stats", "nrc", current_user.nrc),
+        {"nrc": current_user.nrc},
+        lambda: _calcular_global_stats(current_user.nrc),
+    )
 
-    # B. TOTAL EVALUADOS ÚNICOS (MongoDB): ¿Cuál es el estado actual de los que participaron?
-    pipeline = [
-        # 1. Filtramos: Solo exámenes de este curso (NRC)
-        {"$match": {"nrc": current_user.nrc}},
-        
-        # 2. Ordenamos: Del más reciente al más antiguo
-        {"$sort": {"created_at": -1}},
-        
-        # 3. Agrupamos por ALUMNO: Nos quedamos solo con su PRIMER registro (el más reciente)
-        # Esto elimina las repeticiones. Si Juan hizo 5 tests, solo cuenta el último.
-        {"$group": {
-            "_id": "$user_id",
-            "latest_level": {"$first": "$final_stress_level"} # Ej: "Alto"
-        }},
-        
-        # 4. Contamos: ¿Cuántos alumnos quedaron en cada nivel?
-        {"$group": {
-            "_id": "$latest_level",
-            "count": {"$sum": 1}
-        }}
-    ]
-    
-    try:
-        results = list(mongo_db["stress_evaluations"].aggregate(pipeline))
-    except Exception as e:
-        print(f"Error en Mongo: {e}")
-        return {"total_evaluated": 0, "total_enrolled": total_enrolled, "distribution": []}
-    
-    # Procesamos los resultados para que el Frontend los entienda fácil
+async def _en_paralelo(*consultas):
+    """
+    Lanza consultas independientes (SQL / Mongo) a la vez en el threadpool de Starlette:
+    la latencia es la de la más lenta. Cada consulta SQL abre su propia sesión
+    (una Session no se puede compartir entre hilos).
+    """
+    return await asyncio.gather(*(run_in_threadpool(c) for c in consultas))
+
+def _contar_por_nivel(ultimos: list) -> dict:
+    """Cuenta alumnos por nivel a partir de su última evaluación, normalizando el texto del nivel"""
     counts = {"Bajo": 0, "Medio": 0, "Alto": 0}
     
-    for r in results:
-        raw_level = r.get("_id") # Ej: "Medio"
-        count = r.get("count", 0) # Ej: 5
+    for r in ultimos:
+        raw_level = r.get("final_stress_level") # Ej: "Medio"
+        count = 1 # Cada registro es UN alumno
         
         if raw_level:
             # Normalizamos texto (por si guardaste "medio" minúscula alguna vez)
@@ -99,45 +91,94 @@ def get_global_stats(
             if "Bajo" in level_norm: counts["Bajo"] += count
             elif "Medio" in level_norm: counts["Medio"] += count
             elif "Alto" in level_norm: counts["Alto"] += count
+    return counts
+
+def _distribucion(counts: dict) -> list:
+    return [
+        {"name": "Bajo", "value": counts["Bajo"], "fill": "#4caf50"},
+        {"name": "Medio", "value": counts["Medio"], "fill": "#ff9800"},
+        {"name": "Alto", "value": counts["Alto"], "fill": "#f44336"},
+    ]
+
+async def _calcular_global_stats(nrc: str):
+    # A. TOTAL INSCRITOS (SQL): ¿Cuántos alumnos hay en la lista oficial?
+    # Esto cuenta a todos (los que hicieron test y los que no)
+    def contar_inscritos():
+        db = SessionLocal()
+        try:
+            return db.query(User).filter(
+                User.role == 'student',
+                User.nrc == nrc
+            ).count()
+        finally:
+            db.close()
+
+    # B. TOTAL EVALUADOS ÚNICOS: ¿Cuál es el estado actual de los que participaron?
+    # Solo el registro más reciente de cada alumno del NRC: si Juan hizo 5 tests, solo cuenta el último.
+    def agregar_niveles():
+        try:
+            return get_repository().latest_per_student(nrcs=[nrc])
+        except Exception as e:
+            print(f"Error consultando evaluaciones: {e}")
+            return None
+
+    # A y B no dependen una de otra: las lanzamos a la vez
+    total_enrolled, results = await _en_paralelo(contar_inscritos, agregar_niveles)
+
+    if results is None:
+        return {"total_evaluated": 0, "total_enrolled": total_enrolled, "distribution": []}
+    
+    # Procesamos los resultados para que el Frontend los entienda fácil
+    counts = _contar_por_nivel(results)
 
     # El total de EVALUADOS es la suma de los niveles (NO la lista de inscritos)
     total_evaluated = sum(counts.values())
     
     return {
-        "nrc_filter": current_user.nrc,
+        "nrc_filter": nrc,
         "total_evaluated": total_evaluated,  # Ej: 3 alumnos han dado la prueba
         "total_enrolled": total_enrolled,    # Ej: 5 alumnos existen en total
-        "distribution": [
-            {"name": "Bajo", "value": counts["Bajo"], "fill": "#4caf50"},
-            {"name": "Medio", "value": counts["Medio"], "fill": "#ff9800"},
-            {"name": "Alto", "value": counts["Alto"], "fill": "#f44336"},
-        ]
+        "distribution": _distribucion(counts)
     }
 
 # 2. Lista de Estudiantes con ESTADO ACTUAL
 @router.get("/students")
-def get_students(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_students(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     if not current_user.nrc: return []
 
+    return respuesta_cacheada(
+        request, response, ("students", "nrc", current_user.nrc),
+        {"nrc": current_user.nrc},
+        lambda: _calcular_students(db, current_user),
+    )
+
+def _calcular_students(db: Session, current_user: User):
     # 1. Traer usuarios de SQL
     users = db.query(User).filter(
         User.role == 'student', 
         User.nrc == current_user.nrc
     ).all()
     
-    student_list = []
+    # 2. UNA sola consulta para la última "nota" de estrés de todos los alumnos
+    # (antes era un find_one por alumno)
+    ultimos = {}
+    if users:
+        ultimos = {
+            r["user_id"]: r.get("final_stress_level")
+            for r in get_repository().latest_per_student(user_ids=[u.id for u in users])
+        }
     
-    # 2. Por cada alumno, buscamos su última "nota" de estrés en Mongo
+    student_list = []
     for u in users:
-        last_eval = mongo_db["stress_evaluations"].find_one(
-            {"user_id": u.id},
-            sort=[("created_at", -1)] # El más reciente
-        )
-        
         # Si tiene evaluación, tomamos el nivel. Si no, es "Pendiente"
         current_level = "Pendiente"
-        if last_eval and "final_stress_level" in last_eval:
-            current_level = str(last_eval["final_stress_level"]).capitalize()
+        if ultimos.get(u.id):
+            current_level = str(ultimos[u.id]).capitalize()
             
         student_list.append({
             "id": u.id, 
@@ -150,14 +191,157 @@ def get_students(db: Session = Depends(get_db), current_user: User = Depends(get
 
 # 3. Historial de Estudiante
 @router.get("/student-history/{student_id}")
-def get_student_history(student_id: int, current_user: User = Depends(get_current_user)):
-    cursor = mongo_db["stress_evaluations"].find({"user_id": student_id}).sort("created_at", 1)
+def get_student_history(
+    student_id: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    return respuesta_cacheada(
+        request, response, ("student-history", "user", student_id),
+        {"user_id": student_id},
+        lambda: _calcular_student_history(student_id),
+    )
+
+def _calcular_student_history(student_id: int):
     history = []
-    for doc in cursor:
+    for doc in get_repository().history(student_id):
         history.append({
             "date": doc["created_at"].strftime("%Y-%m-%d %H:%M"),
             "pss_score": doc.get("pss_score", 0),
             "negative_ratio": doc.get("negative_ratio", 0) * 100,
             "final_level": doc.get("final_stress_level", "Medio")
         })
-    return history
\ No newline at end of file
+    return history
+
+# 4. Tendencia del NRC (desde los rollups diarios, no desde stress_evaluations)
+@router.get("/trends")
+def get_trends(
+    start: str = Query(None, description="Fecha inicial YYYY-MM-DD"),
+    end: str = Query(None, description="Fecha final YYYY-MM-DD"),
+    current_user: User = Depends(get_current_user)
+):
+    if not current_user.nrc:
+        return {"nrc_filter": None, "series": [], "warning": "Docente sin NRC"}
+
+    # 'day' se guarda como texto YYYY-MM-DD: normalizamos (2024-3-1 -> 2024-03-01) para comparar bien
+    try:
+        if start: start = datetime.strptime(start, "%Y-%m-%d").strftime("%Y-%m-%d")
+        if end: end = datetime.strptime(end, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas con formato YYYY-MM-DD")
+
+    try:
+        series = obtener_tendencia(current_user.nrc, start, end)
+    except Exception as e:
+        print(f"Error en Mongo: {e}")
+        series = []
+
+    return {"nrc_filter": current_user.nrc, "series": series}
+
+# 5. Vista institucional: varios NRC en una sola consulta SQL + una agregación Mongo
+@router.get("/overview")
+async def get_overview(
+    nrcs: str = Query(None, description="NRC separados por coma (vacío = todos)"),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role == "student":
+        raise HTTPException(status_code=403, detail="Solo para docentes")
+
+    lista_nrc = [n.strip() for n in nrcs.split(",") if n.strip()] if nrcs else None
+
+    def contar_inscritos():
+        db = SessionLocal()
+        try:
+            query = db.query(User.nrc, func.count(User.id)).filter(User.role == 'student')
+            if lista_nrc:
+                query = query.filter(User.nrc.in_(lista_nrc))
+            return dict(query.group_by(User.nrc).all())
+        finally:
+            db.close()
+
+    def agregar_niveles():
+        # Último registro de cada alumno dentro de cada NRC
+        try:
+            return get_repository().latest_per_student(nrcs=lista_nrc)
+        except Exception as e:
+            print(f"Error consultando evaluaciones: {e}")
+            return []
+
+    inscritos, results = await _en_paralelo(contar_inscritos, agregar_niveles)
+
+    # Repartimos los alumnos por NRC
+    por_nrc = {}
+    for r in results:
+        por_nrc.setdefault(r["nrc"], []).append(r)
+
+    classes = []
+    totales = {"Bajo": 0, "Medio": 0, "Alto": 0}
+    for nrc in sorted(set(inscritos) | set(por_nrc), key=str):
+        if not nrc:
+            continue
+        counts = _contar_por_nivel(por_nrc.get(nrc, []))
+        for nivel, valor in counts.items():
+            totales[nivel] += valor
+        classes.append({
+            "nrc": nrc,
+            "total_evaluated": sum(counts.values()),
+            "total_enrolled": inscritos.get(nrc, 0),
+            "distribution": _distribucion(counts),
+        })
+
+    return {
+        "total_classes": len(classes),
+        "total_evaluated": sum(totales.values()),
+        "total_enrolled": sum(c["total_enrolled"] for c in classes),
+        "distribution": _distribucion(totales),
+        "classes": classes,
+    }
+
+# 6. Contadores del rate limiting de la ingesta de frames (antes en /api/ingestion/stats, público)
+@router.get("/ingestion-stats")
+def get_ingestion_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role == "student":
+        raise HTTPException(status_code=403, detail="Solo para docentes")
+    return ingest_limiter.stats()
+
+# 7. Exportación del NRC (CSV / Parquet) en streaming, sin cargar todo en memoria
+@router.get("/export")
+def export_evaluations(
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    start: str = Query(None, description="Fecha inicial YYYY-MM-DD"),
+    end: str = Query(None, description="Fecha final YYYY-MM-DD (incluida)"),
+    level: str = Query(None, description="Nivel final: Bajo, Medio o Alto"),
+    include_frames: bool = Query(False, description="Unir el resumen de frames de cada sesión"),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role == "student":
+        raise HTTPException(status_code=403, detail="Solo para docentes")
+    if not current_user.nrc:
+        raise HTTPException(status_code=400, detail="Docente sin NRC")
+    # La exportación lee directo de Mongo: sin él (p. ej. STORAGE_BACKEND=embedded) fallamos
+    # ANTES de enviar el 200, no a mitad del streaming
+    if not mongo_disponible():
+        raise HTTPException(status_code=501, detail="Exportación no disponible sin MongoDB")
+
+    filtro = {"nrc": current_user.nrc}
+    try:
+        rango = {}
+        if start: rango["$gte"] = datetime.strptime(start, "%Y-%m-%d")
+        if end: rango["$lt"] = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+        if rango: filtro["created_at"] = rango
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas con formato YYYY-MM-DD")
+    if level:
+        filtro["final_stress_level"] = {"$in": [level.capitalize(), level.lower()]}
+
+    nombre = f"evaluaciones_{current_user.nrc}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{nombre}"'}
+
+    if format == "parquet":
+        return StreamingResponse(
+            stream_parquet(filtro, include_frames),
+            media_type="application/vnd.apache.parquet",
+            headers=headers,
+        )
+    return StreamingResponse(stream_csv(filtro, include_frames), media_type="text/csv", headers=headers)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
-from app.database.mongo import mongo_db
+import math
+from app.repositories import get_repository
+from app.services.rate_limit import ingest_limiter
 # ⚡ OPTIMIZACIÓN: Quitamos imports de SQL para no usarlo aquí
 # from app.database.connection import SessionLocal
 # from app.models.emotion_session import EmotionSession
@@ -17,8 +19,18 @@ class EmotionPayload(BaseModel):
 @router.post("/emotions")
 async def save_emotion(payload: EmotionPayload):
 
-    # 1. Guardar SOLO en MongoDB (Esto es rápido y no bloquea)
-    mongo_db["emotions"].insert_one({
+    # 0. Control de admisión: un cliente que manda demasiados frames se frena aquí,
+    # antes de tocar MongoDB
+    admitido, retry_after, motivo = ingest_limiter.allow(payload.session_id)
+    if not admitido:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Demasiados frames ({motivo}), reintenta en {retry_after:.2f}s",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    # 1. Guardar SOLO en MongoDB / backend embebido (Esto es rápido y no bloquea)
+    get_repository().insert_frame({
         "user_id": payload.user_id,
         "session_id": payload.session_id,
         "emotions": payload.emotions,
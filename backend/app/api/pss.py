@@ -1,35 +1,29 @@
 # app/api/pss.py
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, conint
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from pydantic import BaseModel, conint, conlist
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 from datetime import datetime
-import pandas as pd
-import joblib
-import os
 import numpy as np
 
+from app.api.admin import get_current_user
 from app.database.connection import SessionLocal
-from app.database.mongo import mongo_db
 from app.models.user import User
+from app.repositories import get_repository
+from app.services import scoring
+from app.services.cache import invalidar_evaluacion
+from app.services.compaction import compactar_sesion
+from app.services.rollups import registrar_evaluaciones
+from app.services.scoring import (
+    categorize_pss, features_desde_promedios, fusion_vectorizada,
+    nivel_facial_fallback, predecir_niveles
+)
 
 router = APIRouter(prefix="/pss", tags=["pss"])
 
 # --- 1. CARGA DEL MODELO DE IA ---
-# Buscamos el archivo .pkl en la carpeta superior 'models' o donde lo hayas puesto
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Sube un nivel a 'app'
-MODEL_PATH = os.path.join(BASE_DIR, "models", "stress_model.pkl") 
-
-# Variable global para el modelo
-stress_model = None
-
-try:
-    stress_model = joblib.load(MODEL_PATH)
-    print(f"✅ Cerebro Digital (IA) cargado desde: {MODEL_PATH}")
-except Exception as e:
-    print(f"⚠️ ADVERTENCIA: No se pudo cargar el modelo de IA. Ruta buscada: {MODEL_PATH}")
-    print(f"   Error: {e}")
-    # El sistema funcionará, pero solo con el cuestionario (modo fallback)
+# El modelo se carga en app/services/scoring.py (compartido con el job de re-scoring)
+stress_model = scoring.stress_model
 
 def get_db():
     db = SessionLocal()
@@ -43,81 +37,97 @@ class PSSSubmitPayload(BaseModel):
     session_id: str
     pss_score: conint(ge=0, le=40)
 
-# --- 2. FUNCIONES AUXILIARES ---
-
-def categorize_pss(score: int) -> str:
-    """Clasificación estándar del PSS-10"""
-    if score <= 13: return "bajo"
-    elif score <= 26: return "medio"
-    else: return "alto"
-
-def compute_emotion_stats(session_id: str):
-    """Calcula promedios de las emociones guardadas en Mongo para esta sesión"""
-    docs = list(mongo_db["emotions"].find({"session_id": session_id}))
-
-    if not docs:
-        return None, 0.0
-
-    # Crear DataFrame para facilitar cálculos
-    # Extraemos solo la parte de 'emotions' de cada documento
-    emotions_list = [d["emotions"] for d in docs]
-    df = pd.DataFrame(emotions_list)
-    
-    # Calcular promedios
-    averages = df.mean().to_dict()
-    
-    # Renombrar claves para que coincidan con lo que espera el modelo (si es necesario)
-    # Tu modelo espera: neutral_avg, happiness_avg...
-    # Tus datos en mongo vienen como: neutral, happy, sad...
-    mapping = {
-        'neutral': 'neutral_avg', 'happy': 'happiness_avg', 'sad': 'sadness_avg',
-        'angry': 'anger_avg', 'fearful': 'fear_avg', 'disgusted': 'disgust_avg',
-        'surprised': 'surprise_avg'
-    }
-    
-    final_features = {}
-    for k_mongo, k_model in mapping.items():
-        final_features[k_model] = averages.get(k_mongo, 0.0)
-
-    # Calcular Negative Ratio (Suma de emociones negativas > umbral)
-    # Emociones negativas: angry, fearful, sad, disgusted
-    neg_cols = [c for c in ['angry', 'fearful', 'sad', 'disgusted'] if c in df.columns]
-    
-    # Suma de negativas por fila
-    if neg_cols:
-        neg_sum = df[neg_cols].sum(axis=1)
-        # Si la suma de negativas es > 0.1, se considera un "frame negativo"
-        negative_count = (neg_sum > 0.1).sum()
-        negative_ratio = negative_count / len(df)
-    else:
-        negative_ratio = 0.0
-        
-    final_features['negative_ratio'] = negative_ratio
-    
-    return final_features, negative_ratio
-
-def fusion_algoritmo(nivel_pss_txt: str, nivel_facial_txt: str) -> str:
-    """Algoritmo de Fusión 60/40 (Test vs Cara)"""
-    mapa_valor = {"bajo": 1, "medio": 2, "alto": 3}
-    mapa_texto = {1: "Bajo", 2: "Medio", 3: "Alto"}
-    
-    val_pss = mapa_valor.get(nivel_pss_txt, 1)
-    # Si la IA falló o dio error, asumimos neutro (1) o seguimos al PSS
-    val_face = mapa_valor.get(nivel_facial_txt, val_pss) 
-    
-    # FÓRMULA MATEMÁTICA
-    # 60% PSS (Validado científicamente) + 40% IA (Experimental)
-    score_final = (val_pss * 0.6) + (val_face * 0.4)
-    
-    # Redondeo simple (1.6 -> 2, 1.4 -> 1)
-    resultado_num = int(round(score_final))
-    
-    return mapa_texto.get(resultado_num, "Medio")
+class PSSBulkSubmitPayload(BaseModel):
+    # Ej: una clase completa que llenó el PSS en papel
+    entries: conlist(PSSSubmitPayload, min_length=1, max_length=500)
+
+# --- 2. PUNTUACIÓN Y GUARDADO (común a /submit y /submit-bulk) ---
+
+def _evaluar_lote(entries: list, users: dict, background_tasks: BackgroundTasks) -> list:
+    """
+    Puntúa y guarda un lote de envíos PSS ya validados ('users': user_id -> User).
+    Un envío individual es un lote de uno: el documento, el rollup, la caché y la
+    compactación se resuelven siempre aquí. Devuelve los documentos guardados.
+    """
+    # B. Niveles PSS (Cuestionario)
+    pss_levels = [categorize_pss(e.pss_score) for e in entries]
+
+    # C. Datos de la Cámara (UNA agregación) y predicción en lote (UNA llamada al modelo)
+    # El Negative Ratio (frames con angry+fearful+sad+disgusted > 0.1) lo calcula el backend
+    stats = get_repository().session_stats(list({e.session_id for e in entries}))
+    con_camara = [i for i, e in enumerate(entries) if e.session_id in stats]
+
+    # Sin datos de cámara: fallback simple
+    emotion_levels = [nivel_facial_fallback(0.0)] * len(entries)
+    if con_camara:
+        features = [features_desde_promedios(*stats[entries[i].session_id]) for i in con_camara]
+        try:
+            # Sin modelo cargado, predecir_niveles usa los umbrales de nivel_facial_fallback
+            for i, nivel in zip(con_camara, predecir_niveles(features)):
+                emotion_levels[i] = nivel
+        except Exception as e:
+            print(f"❌ Error en predicción IA: {e}")
+            for i in con_camara:
+                emotion_levels[i] = "error"
+
+    # D. Fusión de Datos (vectorizada)
+    niveles_finales = fusion_vectorizada(pss_levels, emotion_levels)
+
+    # E. Guardar todas las evaluaciones (UN insert_many, o insert_one si es una sola)
+    ahora = datetime.utcnow()
+    docs = []
+    for i, e in enumerate(entries):
+        user = users[e.user_id]
+        promedios, negative_ratio = stats.get(e.session_id, ({}, 0.0))
+        docs.append({
+            "user_id": user.id,
+            "session_id": e.session_id,
+            "age": user.age,
+            "gender": user.gender,
+            "nrc": user.nrc,
+            "pss_score": e.pss_score,
+            
+            # Resultados
+            "pss_level": pss_levels[i],                   # Resultado del Test
+            "facial_level": emotion_levels[i],            # Resultado de la IA
+            "final_stress_level": niveles_finales[i],     # Resultado FUSIONADO
+            "model_version": scoring.MODEL_VERSION if e.session_id in stats and stress_model else None,
+            
+            # Métricas crudas
+            "negative_ratio": negative_ratio,
+            "emotion_averages": promedios,
+            
+            "created_at": ahora
+        })
+
+    get_repository().insert_evaluations(docs)
+
+    # El dashboard de estos NRC/alumnos ya no es válido
+    for user_id in {e.user_id for e in entries}:
+        invalidar_evaluacion(users[user_id].nrc, user_id)
+
+    # Actualizar los rollups diarios (para /admin/trends). Si falla, no bloquea la respuesta.
+    try:
+        registrar_evaluaciones(docs)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el rollup diario: {e}")
+
+    # Compactar cada sesión con cámara una sola vez y programar la expiración de sus
+    # frames crudos (después de responder)
+    compactadas = set()
+    for doc in docs:
+        if doc["session_id"] in stats and doc["session_id"] not in compactadas:
+            compactadas.add(doc["session_id"])
+            background_tasks.add_task(
+                compactar_sesion, doc["session_id"], doc["user_id"], doc["emotion_averages"], doc["negative_ratio"]
+            )
+
+    return docs
 
 # --- 3. ENDPOINT PRINCIPAL ---
 
 @router.post("/submit")
-def submit_pss(payload: PSSSubmitPayload, db: Session = Depends(get_db)):
+def submit_pss(payload: PSSSubmitPayload, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     print(f"📥 Recibiendo PSS para sesión: {payload.session_id}")
 
     # A. Validar Usuario
@@ -125,90 +135,69 @@ def submit_pss(payload: PSSSubmitPayload, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    # B. Calcular Nivel PSS (Cuestionario)
-    pss_level = categorize_pss(payload.pss_score)
-    
-    # C. Obtener Datos de la Cámara y Usar IA
-    features_ia, negative_ratio = compute_emotion_stats(payload.session_id)
-    
-    emotion_level_ia = "desconocido"
-    
-    if features_ia and stress_model:
-        try:
-            # Crear DataFrame con una sola fila para predecir
-            # Importante: El orden de columnas debe ser IGUAL al entrenamiento
-            cols_modelo = [
-                'neutral_avg', 'happiness_avg', 'sadness_avg', 'anger_avg', 
-                'fear_avg', 'disgust_avg', 'surprise_avg', 'negative_ratio' 
-            ]
-            df_input = pd.DataFrame([features_ia])
-            # Reordenar y asegurar que estén todas las columnas (rellenar con 0 si falta)
-            for col in cols_modelo:
-                if col not in df_input.columns:
-                    df_input[col] = 0.0
-            df_input = df_input[cols_modelo]
-            
-            # PREDICCIÓN
-            prediccion = stress_model.predict(df_input)[0] # Devuelve "bajo", "medio" o "alto"
-            emotion_level_ia = prediccion
-            print(f"🤖 IA Predice: {emotion_level_ia}")
-            
-        except Exception as e:
-            print(f"❌ Error en predicción IA: {e}")
-            emotion_level_ia = "error"
-    else:
-        print("⚠️ No hay datos de cámara o modelo no cargado.")
-        # Fallback simple si no hay IA
-        if negative_ratio > 0.4: emotion_level_ia = "alto"
-        elif negative_ratio > 0.15: emotion_level_ia = "medio"
-        else: emotion_level_ia = "bajo"
-
-    # D. Fusión de Datos
-    nivel_final_fusionado = fusion_algoritmo(pss_level, emotion_level_ia)
-
-    # E. Guardar en MongoDB
-    # Convertimos los keys de vuelta a formato simple para guardar limpio
-    # (Opcional, pero ordenado)
-    avg_to_save = {}
-    if features_ia:
-        # mapeo inverso simple para visualización
-        inv_map = {'neutral_avg': 'neutral', 'happiness_avg': 'happy', 'sadness_avg': 'sad', 
-                   'anger_avg': 'angry', 'fear_avg': 'fearful', 'disgust_avg': 'disgusted', 'surprise_avg': 'surprised'}
-        for k_ia, v in features_ia.items():
-            if k_ia in inv_map:
-                avg_to_save[inv_map[k_ia]] = v
-
-    evaluation_doc = {
-        "user_id": user.id,
-        "session_id": payload.session_id,
-        "age": user.age,
-        "gender": user.gender,
-        "nrc": user.nrc,
-        "pss_score": payload.pss_score,
-        
-        # Resultados
-        "pss_level": pss_level,                # Resultado del Test
-        "facial_level": emotion_level_ia,      # Resultado de la IA
-        "final_stress_level": nivel_final_fusionado, # Resultado FUSIONADO
-        
-        # Métricas crudas
-        "negative_ratio": negative_ratio,
-        "emotion_averages": avg_to_save,
-        
-        "created_at": datetime.utcnow()
-    }
-
-    mongo_db["stress_evaluations"].insert_one(evaluation_doc)
+    evaluation_doc = _evaluar_lote([payload], {user.id: user}, background_tasks)[0]
+    print(f"🤖 Nivel facial: {evaluation_doc['facial_level']} -> final: {evaluation_doc['final_stress_level']}")
 
     # F. Retornar al Frontend
     # Esto es lo que recibe EmotionDetector.tsx -> res.data
     return {
         "pss_score": payload.pss_score,
-        "pss_level": pss_level,           # Texto: "medio"
-        "emotion_level": emotion_level_ia, # Texto: "bajo" (lo que dijo la IA)
-        "nivel_final": nivel_final_fusionado, # Texto: "Medio" (la fusión)
+        "pss_level": evaluation_doc["pss_level"],             # Texto: "medio"
+        "emotion_level": evaluation_doc["facial_level"],      # Texto: "bajo" (lo que dijo la IA)
+        "nivel_final": evaluation_doc["final_stress_level"],  # Texto: "Medio" (la fusión)
         
         # Para gráficos
-        "negative_ratio": negative_ratio,
-        "emotion_averages": avg_to_save,
-    }
\ No newline at end of file
+        "negative_ratio": evaluation_doc["negative_ratio"],
+        "emotion_averages": evaluation_doc["emotion_averages"],
+    }
+
+# --- 4. ENVÍO MASIVO (clase completa) ---
+
+@router.post("/submit-bulk")
+def submit_pss_bulk(
+    payload: PSSBulkSubmitPayload,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Solo docentes, y solo para alumnos de su propio NRC
+    if current_user.role == "student":
+        raise HTTPException(status_code=403, detail="Solo para docentes")
+    if not current_user.nrc:
+        raise HTTPException(status_code=400, detail="Docente sin NRC")
+
+    entries = payload.entries
+    print(f"📥 Recibiendo PSS masivo: {len(entries)} evaluaciones")
+
+    # A. Validar Usuarios (UNA consulta SQL para todos)
+    ids = {e.user_id for e in entries}
+    users = {u.id: u for u in db.query(User).filter(User.id.in_(ids)).all()}
+
+    errores = []
+    for e in entries:
+        if e.user_id not in users:
+            errores.append({"user_id": e.user_id, "session_id": e.session_id, "detail": "Usuario no encontrado"})
+        elif users[e.user_id].nrc != current_user.nrc:
+            errores.append({"user_id": e.user_id, "session_id": e.session_id, "detail": "Alumno fuera del NRC del docente"})
+    entries = [e for e in entries if e.user_id in users and users[e.user_id].nrc == current_user.nrc]
+    if not entries:
+        return {"processed": 0, "results": [], "errors": errores}
+
+    docs = _evaluar_lote(entries, users, background_tasks)
+
+    # F. Retornar
+    return {
+        "processed": len(docs),
+        "results": [
+            {
+                "user_id": d["user_id"],
+                "session_id": d["session_id"],
+                "pss_score": d["pss_score"],
+                "pss_level": d["pss_level"],
+                "emotion_level": d["facial_level"],
+                "nivel_final": d["final_stress_level"],
+            }
+            for d in docs
+        ],
+        "errors": errores,
+    }
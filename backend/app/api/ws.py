@@ -1,21 +1,86 @@
-from fastapi import APIRouter, WebSocket
-from app.database.mongo import mongo_db
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketState
+from app.api.admin import get_current_user
+from app.models.user import User
+from app.repositories import get_repository
+from app.services.rate_limit import ingest_limiter
+from app.services.ws_manager import ws_manager
 from datetime import datetime
+import json
 
 ws_router = APIRouter()
 
+# Si un cliente encadena tantos frames rechazados, cerramos con 1013 (Try Again Later)
+MAX_DESCARTES_SEGUIDOS = 50
+
 @ws_router.websocket("/ws/emotions")
 async def ws_emotions(websocket: WebSocket):
-    await websocket.accept()
+    conexion = await ws_manager.connect(websocket)
+    if conexion is None:
+        return
+    descartes_seguidos = 0
+
+    try:
+        while True:
+            texto = await websocket.receive_text()
+            data = json.loads(texto)
+            if not isinstance(data, dict):
+                # JSON válido pero no es un objeto (p. ej. [1, 2]): también es 1003
+                raise ValueError("expected a JSON object")
+
+            # Respuesta al ping del heartbeat: solo cuenta como actividad
+            if data.get("type") == "pong":
+                ws_manager.registrar_mensaje(conexion, len(texto), es_frame=False)
+                continue
+            ws_manager.registrar_mensaje(conexion, len(texto))
+
+            # Control de admisión por sesión (o por usuario si el cliente no manda session_id)
+            clave = data.get("session_id") or f"user:{data.get('user_id')}"
+            admitido, retry_after, motivo = ingest_limiter.allow(clave)
+            if not admitido:
+                descartes_seguidos += 1
+                if descartes_seguidos >= MAX_DESCARTES_SEGUIDOS:
+                    await websocket.close(code=1013, reason=f"rate limit, retry after {retry_after:.2f}s")
+                    return
+                await websocket.send_json({"status": "throttled", "reason": motivo, "retry_after": retry_after})
+                continue
+            descartes_seguidos = 0
+
+            frame = {
+                "user_id": data["user_id"],
+                "emotions": data["emotions"],
+                "timestamp": data["timestamp"],
+                "created_at": datetime.utcnow()
+            }
+            try:
+                # insert_one es bloqueante: fuera del event loop para no frenar a las demás conexiones
+                await run_in_threadpool(get_repository().insert_frame, frame, True)
+            except Exception as e:
+                # Caída del almacenamiento (p. ej. "MongoDB NO disponible"): 1011 y queda en el log
+                print(f"❌ Error guardando frame del WebSocket: {e}")
+                await websocket.close(code=1011, reason="storage unavailable")
+                return
 
-    while True:
-        data = await websocket.receive_json()
+            await websocket.send_json({"status": "received"})
+    except WebSocketDisconnect:
+        # El cliente se fue
+        pass
+    except RuntimeError:
+        # Starlette lanza RuntimeError al leer/escribir en un socket ya cerrado (p. ej. por
+        # el heartbeat). Cualquier otro RuntimeError es un error real y no se oculta.
+        if WebSocketState.DISCONNECTED not in (websocket.application_state, websocket.client_state):
+            raise
+    except (ValueError, KeyError) as e:
+        # Mensaje mal formado: cerramos con 1003 (unsupported data)
+        await websocket.close(code=1003, reason=f"bad message: {e}")
+    finally:
+        ws_manager.disconnect(conexion)
 
-        mongo_db["emotions_stream"].insert_one({
-            "user_id": data["user_id"],
-            "emotions": data["emotions"],
-            "timestamp": data["timestamp"],
-            "created_at": datetime.utcnow()
-        })
+@ws_router.get("/ws/stats")
+def ws_stats(current_user: User = Depends(get_current_user)):
+    """Conexiones vivas y estadísticas por conexión (solo docentes)"""
+    if current_user.role == "student":
+        raise HTTPException(status_code=403, detail="Solo para docentes")
+    return ws_manager.stats()
 
-        await websocket.send_json({"status": "received"})
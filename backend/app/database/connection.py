@@ -11,15 +11,24 @@ load_dotenv()
 # Leer la URL desde el .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Backend embebido sin DATABASE_URL: usuarios en un SQLite local (sin Postgres)
+if not DATABASE_URL and os.getenv("STORAGE_BACKEND", "mongo").lower() == "embedded":
+    DATABASE_URL = "sqlite:///./stress_detector_users.db"
+
 # Corrección para Neon: Si la URL empieza con "postgres://", cámbiala a "postgresql://"
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
 # Crear engine de SQLAlchemy
-engine = create_engine(DATABASE_URL)
+connect_args = {"check_same_thread": False} if DATABASE_URL and DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
 
 # Crear sesión local para consultas
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+def reset_after_fork():
+    """Hook post_fork de gunicorn: el worker abre sus propias conexiones (no usa las del maestro)"""
+    engine.dispose(close=False)
@@ -1,22 +1,77 @@
 # app/database/mongo.py
 from pymongo import MongoClient
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB_NAME = "stress_detector"
+# Con STORAGE_BACKEND=embedded no se intenta conectar a Mongo (ver app/repositories)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
 
+# ⚠️ MongoClient NO es seguro después de fork(): cada proceso (worker de gunicorn,
+# proceso del job de re-scoring...) crea su propio cliente la primera vez que lo usa.
 mongo_client = None
-mongo_db = None
-
-try:
-    mongo_client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=3000)
-    # Hacemos un ping rápido; si falla, usamos None
-    mongo_client.admin.command("ping")
-    mongo_db = mongo_client["stress_detector"]
-    print("✅ Conectado a MongoDB")
-except Exception as e:
-    print("⚠️ MongoDB NO disponible:", e)
+_cliente_pid = None
+_database = None
+_lock = threading.Lock()
+
+
+def get_mongo_db():
+    """Devuelve la base de datos de ESTE proceso (o None si Mongo no está disponible)"""
+    global mongo_client, _cliente_pid, _database
+
+    if _cliente_pid == os.getpid() or STORAGE_BACKEND == "embedded":
+        return _database
+
+    with _lock:
+        if _cliente_pid == os.getpid():
+            return _database
+        try:
+            # No cerramos el cliente heredado del padre: sus sockets son del otro proceso
+            cliente = MongoClient(MONGO_URL, serverSelectionTimeoutMS=3000)
+            # Hacemos un ping rápido; si falla, usamos None
+            cliente.admin.command("ping")
+            mongo_client = cliente
+            _database = cliente[MONGO_DB_NAME]
+            print(f"✅ Conectado a MongoDB (pid {os.getpid()})")
+        except Exception as e:
+            print("⚠️ MongoDB NO disponible:", e)
+            mongo_client = None
+            _database = None
+        _cliente_pid = os.getpid()
+        return _database
+
+def mongo_disponible() -> bool:
+    return get_mongo_db() is not None
+
+def reset_after_fork():
+    """Hook post_fork de gunicorn: olvida el cliente heredado del proceso maestro"""
+    global mongo_client, _cliente_pid, _database
     mongo_client = None
-    mongo_db = None
+    _cliente_pid = None
+    _database = None
+
+
+class _MongoPorProceso:
+    """
+    Reemplazo de la antigua variable global: `mongo_db["coleccion"]` sigue funcionando,
+    pero resuelve el cliente del proceso actual en cada acceso.
+    """
+
+    def _db(self):
+        db = get_mongo_db()
+        if db is None:
+            raise RuntimeError("MongoDB NO disponible")
+        return db
+
+    def __getitem__(self, name):
+        return self._db()[name]
+
+    def __getattr__(self, name):
+        return getattr(self._db(), name)
+
+
+mongo_db = _MongoPorProceso()
@@ -9,11 +9,34 @@ from app.database.connection import Base, engine
 from app.api.pss import router as pss_router
 
 from app.api.admin import router as admin_router
+from app.services.cache import ensure_evaluation_indexes
+from app.services.compaction import ensure_retention_indexes
+from app.services.rollups import ensure_rollup_indexes
+from app.services.ws_manager import ws_manager
+import asyncio
 
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
+@app.on_event("startup")
+def crear_indices():
+    try:
+        ensure_evaluation_indexes()
+        ensure_rollup_indexes()
+        ensure_retention_indexes()
+    except Exception as e:
+        print(f"⚠️ No se pudieron crear los índices de Mongo: {e}")
+
+@app.on_event("startup")
+async def iniciar_heartbeat_ws():
+    # Ping + desalojo de WebSockets inactivos (una tarea por worker)
+    app.state.ws_heartbeat = asyncio.create_task(ws_manager.heartbeat_loop())
+
+@app.on_event("shutdown")
+async def detener_heartbeat_ws():
+    app.state.ws_heartbeat.cancel()
+
 origins = [
     "http://localhost:5173",
     "https://proyecto-lectura-detector-estres.vercel.app",
@@ -0,0 +1,31 @@
+# app/repositories/__init__.py
+"""
+Selección del backend de almacenamiento de frames y evaluaciones:
+
+    STORAGE_BACKEND=mongo      # (por defecto) MongoDB + Postgres
+    STORAGE_BACKEND=embedded   # SQLite embebido, sin servicios externos
+"""
+import os
+
+from dotenv import load_dotenv
+
+from app.repositories.base import EvaluationRepository
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+EMBEDDED_DB_PATH = os.getenv("EMBEDDED_DB_PATH", "stress_detector_embedded.db")
+
+_repository = None
+
+
+def get_repository() -> EvaluationRepository:
+    global _repository
+    if _repository is None:
+        if STORAGE_BACKEND == "embedded":
+            from app.repositories.embedded import EmbeddedRepository
+            _repository = EmbeddedRepository(EMBEDDED_DB_PATH)
+        else:
+            from app.repositories.mongo import MongoRepository
+            _repository = MongoRepository()
+    return _repository
@@ -0,0 +1,43 @@
+# app/repositories/base.py
+
+
+class EvaluationRepository:
+    """
+    Operaciones de almacenamiento que usan los routers (frames y evaluaciones).
+    Implementaciones: MongoRepository (producción) y EmbeddedRepository (SQLite, un solo nodo).
+    """
+
+    # --- Frames de la cámara ---
+
+    def insert_frame(self, frame: dict, stream: bool = False):
+        """Guarda un frame ('emotions') o un mensaje del WebSocket ('emotions_stream' si stream=True)"""
+        raise NotImplementedError
+
+    def session_stats(self, session_ids: list) -> dict:
+        """
+        {session_id: (promedios, negative_ratio)} para las sesiones que tienen frames.
+        'promedios' usa las claves de la cámara (neutral, happy, sad...).
+        Un frame es negativo si angry + fearful + sad + disgusted > 0.1.
+        """
+        raise NotImplementedError
+
+    # --- Evaluaciones (stress_evaluations) ---
+
+    def insert_evaluations(self, docs: list):
+        raise NotImplementedError
+
+    def latest_per_student(self, nrcs: list = None, user_ids: list = None) -> list:
+        """
+        Última evaluación de cada alumno: [{"user_id", "nrc", "final_stress_level"}].
+        Con 'nrcs' se agrupa por (nrc, alumno); con solo 'user_ids', por alumno.
+        Sin filtros, todos los NRC.
+        """
+        raise NotImplementedError
+
+    def history(self, user_id: int) -> list:
+        """Evaluaciones del alumno, de la más antigua a la más reciente"""
+        raise NotImplementedError
+
+    def last_evaluation_at(self, nrc: str = None, user_id: int = None):
+        """Fecha (datetime) de la última evaluación nueva o re-puntuada del NRC o alumno, o None"""
+        raise NotImplementedError
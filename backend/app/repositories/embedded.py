@@ -0,0 +1,189 @@
+# app/repositories/embedded.py
+"""
+Backend embebido (SQLite de la librería estándar) para despliegues de un solo nodo,
+desarrollo local y pruebas de rendimiento sin Postgres ni MongoDB.
+
+    STORAGE_BACKEND=embedded
+    EMBEDDED_DB_PATH=stress_detector_embedded.db   # ":memory:" = todo en RAM (un solo proceso)
+
+Con ":memory:" no hay WAL (SQLite lo ignora en memoria) y la caché compartida bloquea
+por tabla, así que una lectura puede esperar a una escritura en curso.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from app.repositories.base import EvaluationRepository
+from app.repositories.mongo import EMOCIONES, NEGATIVAS
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    stream INTEGER NOT NULL DEFAULT 0,
+    user_id INTEGER,
+    session_id TEXT,
+    emotions TEXT,
+    timestamp REAL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_frames_session ON frames (session_id) WHERE stream = 0;
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    session_id TEXT,
+    nrc TEXT,
+    final_stress_level TEXT,
+    created_at TEXT,
+    doc TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_user ON evaluations (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_evaluations_nrc ON evaluations (nrc, created_at);
+"""
+
+
+def _fecha(valor) -> str:
+    # ISO 8601: ordena igual como texto que como fecha
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+def _json_default(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else str(valor)
+
+
+class EmbeddedRepository(EvaluationRepository):
+
+    def __init__(self, path: str):
+        self.path = path
+        self._uri = False
+        if path == ":memory:":
+            # Cada conexión a ":memory:" sería una base distinta: usamos caché compartida
+            # y una conexión "ancla" abierta para que la base viva mientras exista el repositorio
+            self.path = f"file:stress_detector_{id(self)}?mode=memory&cache=shared"
+            self._uri = True
+            self._ancla = self._conectar()
+        # Una conexión por hilo (y por proceso): las lecturas van en paralelo gracias a WAL.
+        # El lock solo serializa las escrituras de este proceso (evita SQLITE_BUSY entre hilos).
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, uri=self._uri)
+        conn.row_factory = sqlite3.Row
+        # Ajustes para un solo nodo: WAL (lectores no bloquean al escritor),
+        # fsync relajado, temporales y caché en memoria, lecturas por mmap
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(ESQUEMA)
+        return conn
+
+    def _conexion(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            # Nunca reutilizamos una conexión heredada por fork()
+            local.conn = self._conectar()
+            local.pid = os.getpid()
+        return local.conn
+
+    def _consulta(self, sql: str, params=()) -> list:
+        return self._conexion().execute(sql, params).fetchall()
+
+    # --- Frames ---
+
+    def insert_frame(self, frame: dict, stream: bool = False):
+        with self._lock:
+            conn = self._conexion()
+            conn.execute(
+                "INSERT INTO frames (stream, user_id, session_id, emotions, timestamp, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (int(stream), frame.get("user_id"), frame.get("session_id"),
+                 json.dumps(frame.get("emotions") or {}), frame.get("timestamp"),
+                 _fecha(frame.get("created_at"))),
+            )
+            conn.commit()
+
+    def session_stats(self, session_ids: list) -> dict:
+        if not session_ids:
+            return {}
+        promedios_sql = ", ".join(f"AVG(json_extract(emotions, '$.{e}')) AS {e}" for e in EMOCIONES)
+        suma_negativas = " + ".join(f"COALESCE(json_extract(emotions, '$.{e}'), 0)" for e in NEGATIVAS)
+        marcadores = ", ".join("?" for _ in session_ids)
+
+        filas = self._consulta(
+            f"SELECT session_id, COUNT(*) AS frames, {promedios_sql}, "
+            f"SUM(CASE WHEN {suma_negativas} > 0.1 THEN 1 ELSE 0 END) AS negative_count "
+            f"FROM frames WHERE stream = 0 AND session_id IN ({marcadores}) GROUP BY session_id",
+            list(session_ids),
+        )
+
+        stats = {}
+        for f in filas:
+            promedios = {e: f[e] or 0.0 for e in EMOCIONES}
+            stats[f["session_id"]] = (promedios, f["negative_count"] / f["frames"])
+        return stats
+
+    # --- Evaluaciones ---
+
+    def insert_evaluations(self, docs: list):
+        if not docs:
+            return
+        filas = [
+            (d.get("user_id"), d.get("session_id"), d.get("nrc"), d.get("final_stress_level"),
+             _fecha(d.get("created_at")), json.dumps(d, default=_json_default))
+            for d in docs
+        ]
+        with self._lock:
+            conn = self._conexion()
+            conn.executemany(
+                "INSERT INTO evaluations (user_id, session_id, nrc, final_stress_level, created_at, doc) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                filas,
+            )
+            conn.commit()
+
+    def latest_per_student(self, nrcs: list = None, user_ids: list = None) -> list:
+        condiciones, params = [], []
+        if nrcs is not None:
+            condiciones.append(f"nrc IN ({', '.join('?' for _ in nrcs)})")
+            params += list(nrcs)
+        if user_ids is not None:
+            condiciones.append(f"user_id IN ({', '.join('?' for _ in user_ids)})")
+            params += list(user_ids)
+        if not condiciones:
+            condiciones.append("nrc IS NOT NULL AND nrc != ''")
+
+        particion = "user_id" if nrcs is None and user_ids is not None else "nrc, user_id"
+
+        filas = self._consulta(
+            "SELECT user_id, nrc, final_stress_level FROM ("
+            "  SELECT user_id, nrc, final_stress_level,"
+            f"   ROW_NUMBER() OVER (PARTITION BY {particion} ORDER BY created_at DESC) AS rn"
+            f"  FROM evaluations WHERE {' AND '.join(condiciones)}"
+            ") WHERE rn = 1",
+            params,
+        )
+        return [dict(f) for f in filas]
+
+    def history(self, user_id: int) -> list:
+        filas = self._consulta(
+            "SELECT doc FROM evaluations WHERE user_id = ? ORDER BY created_at", (user_id,)
+        )
+        historial = []
+        for f in filas:
+            doc = json.loads(f["doc"])
+            doc["created_at"] = datetime.fromisoformat(doc["created_at"])
+            historial.append(doc)
+        return historial
+
+    def last_evaluation_at(self, nrc: str = None, user_id: int = None):
+        if nrc is not None:
+            filas = self._consulta("SELECT MAX(created_at) AS ultima FROM evaluations WHERE nrc = ?", (nrc,))
+        else:
+            filas = self._consulta("SELECT MAX(created_at) AS ultima FROM evaluations WHERE user_id = ?", (user_id,))
+        ultima = filas[0]["ultima"] if filas else None
+        return datetime.fromisoformat(ultima) if ultima else None
@@ -0,0 +1,82 @@
+# app/repositories/mongo.py
+from app.database.mongo import mongo_db
+from app.repositories.base import EvaluationRepository
+
+EMOCIONES = ['neutral', 'happy', 'sad', 'angry', 'fearful', 'disgusted', 'surprised']
+NEGATIVAS = ['angry', 'fearful', 'sad', 'disgusted']
+
+
+class MongoRepository(EvaluationRepository):
+
+    def insert_frame(self, frame: dict, stream: bool = False):
+        mongo_db["emotions_stream" if stream else "emotions"].insert_one(frame)
+
+    def session_stats(self, session_ids: list) -> dict:
+        # UNA agregación para todas las sesiones (usa el índice session_id)
+        pipeline = [
+            {"$match": {"session_id": {"$in": session_ids}}},
+            {"$group": {
+                "_id": "$session_id",
+                "frames": {"$sum": 1},
+                **{e: {"$avg": f"$emotions.{e}"} for e in EMOCIONES},
+                "negative_count": {"$sum": {"$cond": [
+                    {"$gt": [{"$add": [{"$ifNull": [f"$emotions.{e}", 0]} for e in NEGATIVAS]}, 0.1]}, 1, 0
+                ]}},
+            }},
+        ]
+
+        stats = {}
+        for r in mongo_db["emotions"].aggregate(pipeline):
+            promedios = {e: r.get(e) or 0.0 for e in EMOCIONES}
+            stats[r["_id"]] = (promedios, r["negative_count"] / r["frames"])
+        return stats
+
+    def insert_evaluations(self, docs: list):
+        if len(docs) == 1:
+            mongo_db["stress_evaluations"].insert_one(docs[0])
+        elif docs:
+            mongo_db["stress_evaluations"].insert_many(docs, ordered=False)
+
+    def latest_per_student(self, nrcs: list = None, user_ids: list = None) -> list:
+        match = {}
+        if nrcs is not None:
+            match["nrc"] = {"$in": nrcs}
+        if user_ids is not None:
+            match["user_id"] = {"$in": user_ids}
+        if not match:
+            match["nrc"] = {"$nin": [None, ""]}
+
+        clave = {"user_id": "$user_id"}
+        if nrcs is not None or user_ids is None:
+            clave["nrc"] = "$nrc"
+
+        pipeline = [
+            {"$match": match},
+            # Del más reciente al más antiguo: $first se queda con el último test
+            {"$sort": {"created_at": -1}},
+            {"$group": {
+                "_id": clave,
+                "nrc": {"$first": "$nrc"},
+                "final_stress_level": {"$first": "$final_stress_level"},
+            }},
+        ]
+        return [
+            {"user_id": r["_id"]["user_id"], "nrc": r.get("nrc"), "final_stress_level": r.get("final_stress_level")}
+            for r in mongo_db["stress_evaluations"].aggregate(pipeline, allowDiskUse=True)
+        ]
+
+    def history(self, user_id: int) -> list:
+        return list(mongo_db["stress_evaluations"].find({"user_id": user_id}).sort("created_at", 1))
+
+    def last_evaluation_at(self, nrc: str = None, user_id: int = None):
+        # Evaluación nueva (created_at) o re-puntuada por el job de re-scoring (rescored_at):
+        # cualquiera de las dos cambia lo que muestra el dashboard
+        filtro = {"nrc": nrc} if nrc is not None else {"user_id": user_id}
+        fechas = []
+        for campo in ("created_at", "rescored_at"):
+            doc = mongo_db["stress_evaluations"].find_one(
+                {**filtro, campo: {"$ne": None}}, {campo: 1}, sort=[(campo, -1)]
+            )
+            if doc:
+                fechas.append(doc[campo])
+        return max(fechas) if fechas else None
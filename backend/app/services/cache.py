@@ -0,0 +1,145 @@
+# app/services/cache.py
+"""
+Caché de respuestas del dashboard docente + GET condicional (ETag).
+
+Cada respuesta se guarda con una "marca" = fecha de la última evaluación (nueva o
+re-puntuada) del NRC o del alumno (consultas indexadas de un solo documento).
+Mientras la marca no cambie y la entrada no haya caducado, se devuelve lo guardado
+sin agregar en Mongo; si el navegador ya tiene esa versión (If-None-Match)
+respondemos 304.
+
+No se envía Last-Modified: la marca no refleja altas/bajas de alumnos, así que el
+único validador HTTP es el ETag del contenido.
+
+    ADMIN_CACHE_TTL=60      # segundos máximos de vida (cubre altas y bajas de alumnos)
+    ADMIN_CACHE_MAX=1024    # entradas máximas (LRU)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from pymongo import ASCENDING, DESCENDING
+from starlette.concurrency import run_in_threadpool
+
+from app.database.mongo import mongo_db, mongo_disponible
+from app.repositories import get_repository
+
+load_dotenv()
+
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "60"))
+ADMIN_CACHE_MAX = int(os.getenv("ADMIN_CACHE_MAX", "1024"))
+
+
+class ResponseCache:
+    """LRU en memoria (por proceso) con caducidad"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, marca):
+        with self._lock:
+            entrada = self._entradas.get(key)
+            if entrada is None:
+                return None
+            if entrada["marca"] != marca or time.monotonic() - entrada["guardado"] > self.ttl:
+                del self._entradas[key]
+                return None
+            self._entradas.move_to_end(key)
+            return entrada
+
+    def set(self, key: tuple, marca, payload) -> dict:
+        entrada = {"marca": marca, "payload": payload, "etag": _etag(payload), "guardado": time.monotonic()}
+        with self._lock:
+            self._entradas[key] = entrada
+            self._entradas.move_to_end(key)
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+        return entrada
+
+    def invalidate(self, tipo: str = None, valor=None):
+        """Borra las entradas de un NRC/alumno (o todo si no se indica nada)"""
+        with self._lock:
+            for key in [k for k in self._entradas if tipo is None or (k[1] == tipo and k[2] == valor)]:
+                del self._entradas[key]
+
+
+admin_cache = ResponseCache(ADMIN_CACHE_TTL, ADMIN_CACHE_MAX)
+
+
+def _etag(payload) -> str:
+    contenido = json.dumps(payload, sort_keys=True, default=str).encode()
+    return f'W/"{hashlib.sha1(contenido).hexdigest()[:20]}"'
+
+def ensure_evaluation_indexes():
+    if not mongo_disponible():
+        return
+    evaluaciones = mongo_db["stress_evaluations"]
+    # Marcas de la caché, último estado por alumno y agregaciones por NRC
+    evaluaciones.create_index([("nrc", ASCENDING), ("created_at", DESCENDING)])
+    evaluaciones.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    # La marca también mira 'rescored_at' (solo lo tienen los documentos re-puntuados)
+    evaluaciones.create_index([("nrc", ASCENDING), ("rescored_at", DESCENDING)], sparse=True)
+    evaluaciones.create_index([("user_id", ASCENDING), ("rescored_at", DESCENDING)], sparse=True)
+
+def ultima_evaluacion(filtro: dict):
+    """Fecha de la evaluación más reciente del NRC o alumno (la 'marca' de la caché)"""
+    return get_repository().last_evaluation_at(**filtro)
+
+def invalidar_evaluacion(nrc: str, user_id: int):
+    """Llamar al guardar una evaluación nueva"""
+    if nrc:
+        admin_cache.invalidate("nrc", nrc)
+    admin_cache.invalidate("user", user_id)
+
+def _no_modificado(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [e.strip() for e in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+def respuesta_cacheada(request: Request, response: Response, key: tuple, filtro_marca: dict, calcular):
+    """
+    Devuelve el payload cacheado (o lo calcula con 'calcular()') con su ETag,
+    o un 304 vacío si el cliente ya tiene esta versión.
+    """
+    try:
+        marca = ultima_evaluacion(filtro_marca)
+    except Exception as e:
+        # Sin base de datos no hay marca fiable: calculamos sin caché
+        print(f"Error en Mongo: {e}")
+        return calcular()
+
+    entrada = admin_cache.get(key, marca)
+    if entrada is None:
+        entrada = admin_cache.set(key, marca, calcular())
+    return _responder(request, response, entrada)
+
+async def respuesta_cacheada_async(request: Request, response: Response, key: tuple, filtro_marca: dict, calcular):
+    """Igual que respuesta_cacheada, para endpoints async: 'calcular()' devuelve una corrutina"""
+    try:
+        marca = await run_in_threadpool(ultima_evaluacion, filtro_marca)
+    except Exception as e:
+        print(f"Error en Mongo: {e}")
+        return await calcular()
+
+    entrada = admin_cache.get(key, marca)
+    if entrada is None:
+        entrada = admin_cache.set(key, marca, await calcular())
+    return _responder(request, response, entrada)
+
+def _responder(request: Request, response: Response, entrada: dict):
+    headers = {"ETag": entrada["etag"], "Cache-Control": "private, no-cache"}
+
+    if _no_modificado(request, entrada["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return entrada["payload"]
@@ -0,0 +1,158 @@
+# app/services/compaction.py
+"""
+Compactación post-sesión y retención de frames crudos.
+
+Después de /pss/submit solo se usa el resumen de 'stress_evaluations', así que:
+  1. Guardamos un resumen compacto por sesión en 'session_summaries'
+     (nº de frames, duración, promedios y una traza reducida opcional).
+  2. Marcamos los frames de esa sesión con 'expire_at' y un índice TTL los borra
+     pasado el periodo de gracia.
+  3. Un segundo TTL sobre 'created_at' limpia frames que nunca se puntuaron
+     (sesiones abandonadas) y el canal 'emotions_stream'.
+
+Ventanas configurables en el .env:
+    RAW_FRAMES_GRACE_HOURS=24   # horas que se conservan los frames tras puntuar
+    RAW_FRAMES_MAX_DAYS=30      # máximo absoluto para cualquier frame crudo (0 = sin límite)
+    SESSION_TRACE_POINTS=60     # puntos de la traza reducida (0 = sin traza)
+"""
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from app.database.mongo import mongo_db, mongo_disponible
+
+load_dotenv()
+
+RAW_FRAMES_GRACE_HOURS = float(os.getenv("RAW_FRAMES_GRACE_HOURS", "24"))
+RAW_FRAMES_MAX_DAYS = float(os.getenv("RAW_FRAMES_MAX_DAYS", "30"))
+SESSION_TRACE_POINTS = int(os.getenv("SESSION_TRACE_POINTS", "60"))
+
+SUMMARIES = "session_summaries"
+EMOCIONES = ['neutral', 'happy', 'sad', 'angry', 'fearful', 'disgusted', 'surprised']
+
+
+def _indice_de(collection, field: str):
+    """(nombre, info) del índice simple sobre 'field', con el nombre que tenga, o (None, None)"""
+    for nombre, info in collection.index_information().items():
+        if info.get("key") == [(field, ASCENDING)]:
+            return nombre, info
+    return None, None
+
+def _ttl_index(collection, field: str, seconds: int):
+    """Crea el índice TTL o, si ya existe (con cualquier nombre), ajusta su ventana"""
+    nombre, info = _indice_de(collection, field)
+    if nombre is None:
+        collection.create_index([(field, ASCENDING)], name=f"{field}_ttl", expireAfterSeconds=seconds)
+    elif "expireAfterSeconds" not in info:
+        # Índice normal sobre el mismo campo: no se puede convertir en TTL, lo recreamos
+        collection.drop_index(nombre)
+        collection.create_index([(field, ASCENDING)], name=f"{field}_ttl", expireAfterSeconds=seconds)
+    elif info["expireAfterSeconds"] != seconds:
+        mongo_db.command("collMod", collection.name, index={"name": nombre, "expireAfterSeconds": seconds})
+
+def _quitar_ttl(collection, field: str):
+    """Borra el TTL sobre 'field' si existe (p. ej. al pasar RAW_FRAMES_MAX_DAYS a 0)"""
+    nombre, info = _indice_de(collection, field)
+    if nombre is not None and "expireAfterSeconds" in info:
+        collection.drop_index(nombre)
+        print(f"🗑️ Índice TTL '{nombre}' eliminado de {collection.name}")
+
+def ensure_retention_indexes():
+    if not mongo_disponible():
+        return
+
+    emotions = mongo_db["emotions"]
+    stream = mongo_db["emotions_stream"]
+    max_seconds = int(RAW_FRAMES_MAX_DAYS * 86400)
+
+    pasos = [
+        # Las estadísticas por sesión de /pss/submit y la compactación filtran por sesión
+        lambda: emotions.create_index([("session_id", ASCENDING), ("timestamp", ASCENDING)]),
+        # Frames de sesiones ya puntuadas: expiran en la fecha exacta de 'expire_at'
+        lambda: _ttl_index(emotions, "expire_at", 0),
+    ]
+    if RAW_FRAMES_MAX_DAYS > 0:
+        pasos += [
+            lambda: _ttl_index(emotions, "created_at", max_seconds),
+            lambda: _ttl_index(stream, "created_at", max_seconds),
+        ]
+    else:
+        # Sin límite: el TTL de un despliegue anterior seguiría borrando frames
+        pasos += [lambda: _quitar_ttl(emotions, "created_at"), lambda: _quitar_ttl(stream, "created_at")]
+    pasos.append(lambda: mongo_db[SUMMARIES].create_index([("user_id", ASCENDING), ("created_at", ASCENDING)]))
+
+    # Cada índice por separado: que uno falle no deja sin crear los demás
+    for paso in pasos:
+        try:
+            paso()
+        except OperationFailure as e:
+            print(f"⚠️ Error creando índices de retención: {e}")
+
+def _traza_reducida(session_id: str, puntos: int) -> list:
+    """Promedios por tramo de tiempo: la sesión completa en 'puntos' buckets ($bucketAuto)"""
+    pipeline = [
+        {"$match": {"session_id": session_id}},
+        {"$bucketAuto": {
+            "groupBy": "$timestamp",
+            "buckets": puntos,
+            "output": {
+                "frames": {"$sum": 1},
+                **{e: {"$avg": f"$emotions.{e}"} for e in EMOCIONES},
+            },
+        }},
+    ]
+    traza = []
+    for b in mongo_db["emotions"].aggregate(pipeline):
+        punto = {"t": b["_id"]["min"], "frames": b["frames"]}
+        punto.update({e: b.get(e) or 0.0 for e in EMOCIONES})
+        traza.append(punto)
+    return traza
+
+def compactar_sesion(session_id: str, user_id: int, emotion_averages: dict, negative_ratio: float):
+    """
+    Guarda el resumen compacto de la sesión y programa la expiración de sus frames.
+    Se ejecuta en segundo plano después de /pss/submit.
+    """
+    if not mongo_disponible():
+        return
+
+    try:
+        emotions = mongo_db["emotions"]
+        rango = list(emotions.aggregate([
+            {"$match": {"session_id": session_id}},
+            {"$group": {
+                "_id": None,
+                "frames": {"$sum": 1},
+                "first_ts": {"$min": "$timestamp"},
+                "last_ts": {"$max": "$timestamp"},
+            }},
+        ]))
+        if not rango:
+            return
+        rango = rango[0]
+
+        resumen = {
+            "session_id": session_id,
+            "user_id": user_id,
+            "frames": rango["frames"],
+            "first_ts": rango["first_ts"],
+            "last_ts": rango["last_ts"],
+            "emotion_averages": emotion_averages,
+            "negative_ratio": negative_ratio,
+            "created_at": datetime.utcnow(),
+        }
+        if SESSION_TRACE_POINTS > 0:
+            resumen["trace"] = _traza_reducida(session_id, SESSION_TRACE_POINTS)
+
+        mongo_db[SUMMARIES].replace_one({"_id": session_id}, resumen, upsert=True)
+
+        # Los frames crudos ya no hacen falta: que el TTL los borre tras la gracia
+        expire_at = datetime.utcnow() + timedelta(hours=RAW_FRAMES_GRACE_HOURS)
+        emotions.update_many({"session_id": session_id}, {"$set": {"expire_at": expire_at}})
+
+        print(f"🗜️ Sesión {session_id} compactada ({rango['frames']} frames)")
+    except Exception as e:
+        print(f"⚠️ Error compactando la sesión {session_id}: {e}")
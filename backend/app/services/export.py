@@ -0,0 +1,129 @@
+# app/services/export.py
+"""
+Exportación en streaming de las evaluaciones de un NRC (CSV o Parquet).
+
+Se recorre el cursor de Mongo por bloques: cada bloque se convierte en filas,
+se serializa y se entrega al cliente antes de leer el siguiente, así la memoria
+del servidor no depende del tamaño del semestre.
+"""
+import csv
+import io
+
+from app.database.mongo import mongo_db
+from app.services.compaction import EMOCIONES, SUMMARIES
+
+CHUNK_SIZE = 1000
+
+COLUMNAS_EVALUACION = [
+    "user_id", "session_id", "age", "gender", "nrc", "pss_score",
+    "pss_level", "facial_level", "final_stress_level", "model_version", "negative_ratio",
+]
+COLUMNAS = COLUMNAS_EVALUACION + [f"{e}_avg" for e in EMOCIONES] + ["created_at"]
+COLUMNAS_FRAMES = ["frames", "first_ts", "last_ts"]
+
+
+def _bloques(filtro: dict, include_frames: bool):
+    """Genera listas de filas planas de hasta CHUNK_SIZE evaluaciones"""
+    cursor = (
+        mongo_db["stress_evaluations"]
+        .find(filtro, {"_id": 0})
+        .sort("created_at", 1)
+        .batch_size(CHUNK_SIZE)
+    )
+
+    bloque = []
+    for doc in cursor:
+        bloque.append(doc)
+        if len(bloque) >= CHUNK_SIZE:
+            yield _aplanar(bloque, include_frames)
+            bloque = []
+    if bloque:
+        yield _aplanar(bloque, include_frames)
+
+def _aplanar(docs: list, include_frames: bool) -> list:
+    resumenes = {}
+    if include_frames:
+        # UNA consulta por bloque para unir los resúmenes de sesión
+        ids = [d.get("session_id") for d in docs]
+        for r in mongo_db[SUMMARIES].find({"_id": {"$in": ids}}, {"frames": 1, "first_ts": 1, "last_ts": 1}):
+            resumenes[r["_id"]] = r
+
+    filas = []
+    for d in docs:
+        promedios = d.get("emotion_averages") or {}
+        fila = {c: d.get(c) for c in COLUMNAS_EVALUACION}
+        fila.update({f"{e}_avg": promedios.get(e) for e in EMOCIONES})
+        fila["created_at"] = d.get("created_at")
+        if include_frames:
+            r = resumenes.get(d.get("session_id"), {})
+            fila.update({c: r.get(c) for c in COLUMNAS_FRAMES})
+        filas.append(fila)
+    return filas
+
+def stream_csv(filtro: dict, include_frames: bool = False):
+    columnas = COLUMNAS + (COLUMNAS_FRAMES if include_frames else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columnas)
+
+    writer.writeheader()
+    for filas in _bloques(filtro, include_frames):
+        writer.writerows(filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Si no hubo filas, al menos enviamos la cabecera
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _SalidaIncremental:
+    """Sink para ParquetWriter: acumula lo escrito y lo entrega por partes (tell() sigue creciendo)"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, data):
+        self._partes.append(bytes(data))
+        self._posicion += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+def stream_parquet(filtro: dict, include_frames: bool = False):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    campos = [
+        ("user_id", pa.int64()), ("session_id", pa.string()), ("age", pa.int64()),
+        ("gender", pa.string()), ("nrc", pa.string()), ("pss_score", pa.int64()),
+        ("pss_level", pa.string()), ("facial_level", pa.string()),
+        ("final_stress_level", pa.string()), ("model_version", pa.string()),
+        ("negative_ratio", pa.float64()),
+        *[(f"{e}_avg", pa.float64()) for e in EMOCIONES],
+        ("created_at", pa.timestamp("ms")),
+    ]
+    if include_frames:
+        campos += [("frames", pa.int64()), ("first_ts", pa.float64()), ("last_ts", pa.float64())]
+    schema = pa.schema(campos)
+
+    salida = _SalidaIncremental()
+    # Cada bloque se escribe como un row group y se envía en cuanto está listo
+    with pq.ParquetWriter(salida, schema) as writer:
+        for filas in _bloques(filtro, include_frames):
+            writer.write_table(pa.Table.from_pylist(filas, schema=schema))
+            yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,121 @@
+# app/services/rate_limit.py
+"""
+Control de admisión para la ingesta de frames (/api/emotions y /ws/emotions).
+
+Dos cubetas de tokens: una por sesión (un cliente que manda más de lo debido solo
+se frena a sí mismo) y una global (protege a todos en hora pico). Todo en memoria
+y por proceso: con N workers de gunicorn el límite global efectivo es N veces el valor.
+
+    INGEST_RATE_PER_SESSION=2     # frames/segundo sostenidos por sesión (el front manda ~1 fps)
+    INGEST_BURST_PER_SESSION=5    # ráfaga permitida por sesión
+    INGEST_RATE_GLOBAL=500        # frames/segundo de todo el proceso
+    INGEST_BURST_GLOBAL=1000
+    INGEST_MAX_SESSIONS=10000     # sesiones recordadas (LRU) para acotar memoria
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _limite(nombre: str, defecto: str, tipo=float):
+    """Lee un límite del .env validándolo al arrancar: con rate 0 retry_after dividiría por cero"""
+    valor = tipo(os.getenv(nombre, defecto))
+    if valor <= 0:
+        raise ValueError(f"{nombre} debe ser mayor que 0 (valor actual: {valor})")
+    return valor
+
+
+INGEST_RATE_PER_SESSION = _limite("INGEST_RATE_PER_SESSION", "2")
+INGEST_BURST_PER_SESSION = _limite("INGEST_BURST_PER_SESSION", "5")
+INGEST_RATE_GLOBAL = _limite("INGEST_RATE_GLOBAL", "500")
+INGEST_BURST_GLOBAL = _limite("INGEST_BURST_GLOBAL", "1000")
+INGEST_MAX_SESSIONS = _limite("INGEST_MAX_SESSIONS", "10000", int)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "last")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = now
+
+    def consume(self, now: float) -> float:
+        """Consume un token. Devuelve 0 si se admitió o los segundos a esperar si no."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: float, global_rate: float, global_burst: float,
+                 max_keys: int = INGEST_MAX_SESSIONS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._lock = threading.Lock()
+        self.counters = {"accepted": 0, "dropped_session": 0, "dropped_global": 0}
+
+    def allow(self, key) -> tuple:
+        """
+        Devuelve (admitido, retry_after_segundos, motivo).
+        motivo: None, "session" o "global".
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            espera = bucket.consume(now)
+            if espera:
+                self.counters["dropped_session"] += 1
+                return False, espera, "session"
+
+            espera = self._global.consume(now)
+            if espera:
+                # El frame no entra: devolvemos el token a la sesión
+                bucket.refund()
+                self.counters["dropped_global"] += 1
+                return False, espera, "global"
+
+            self.counters["accepted"] += 1
+            return True, 0.0, None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "tracked_sessions": len(self._buckets),
+                "limits": {
+                    "per_session_rate": self.rate,
+                    "per_session_burst": self.burst,
+                    "global_rate": self._global.rate,
+                    "global_burst": self._global.capacity,
+                },
+            }
+
+
+# Compartido por el endpoint HTTP y el WebSocket
+ingest_limiter = RateLimiter(
+    INGEST_RATE_PER_SESSION, INGEST_BURST_PER_SESSION,
+    INGEST_RATE_GLOBAL, INGEST_BURST_GLOBAL,
+)
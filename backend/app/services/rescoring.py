@@ -0,0 +1,171 @@
+# app/services/rescoring.py
+"""
+Job de re-puntuación de evaluaciones históricas.
+
+Cuando se entrena un modelo nuevo, recalcula 'facial_level' y 'final_stress_level'
+de cada documento de 'stress_evaluations' a partir de 'emotion_averages' y
+'negative_ratio', y marca el documento con 'model_version'.
+
+Uso (desde backend/):
+    python -m app.services.rescoring                      # una sola partición
+    python -m app.services.rescoring --workers 4          # 4 procesos en paralelo
+    python -m app.services.rescoring --partition 1 --partitions 4   # una partición concreta
+
+Es reanudable: el avance de cada partición se guarda en 'rescoring_jobs' y los
+documentos que ya tienen la versión actual se saltan. Las evaluaciones sin datos
+de cámara (emotion_averages vacío) no se re-puntúan, igual que en /pss/submit.
+
+Al terminar cada partición se regeneran los rollups diarios de los NRC tocados, y
+'rescored_at' cambia la marca de la caché del dashboard (ver MongoRepository.last_evaluation_at).
+"""
+import argparse
+import multiprocessing
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app.database.mongo import mongo_db, mongo_disponible
+from app.services import rollups, scoring
+
+CHUNK_SIZE = 500
+
+# Solo traemos lo necesario para puntuar (nada de frames ni metadatos)
+PROYECCION = {"nrc": 1, "pss_score": 1, "pss_level": 1, "emotion_averages": 1, "negative_ratio": 1}
+
+
+def _id_checkpoint(version: str, partition: int, partitions: int) -> str:
+    return f"{version}:{partition}/{partitions}"
+
+def _filtro_pendientes(version: str, partition: int, partitions: int, last_id=None) -> dict:
+    filtro = {
+        "model_version": {"$ne": version},
+        # Sin datos de cámara /pss/submit usa nivel_facial_fallback y no marca versión:
+        # esos documentos no dependen del modelo y no se tocan
+        "emotion_averages": {"$exists": True, "$ne": {}},
+    }
+    if partitions > 1:
+        # Particionamos por alumno: cada proceso toca documentos distintos
+        filtro["user_id"] = {"$mod": [partitions, partition]}
+    if last_id is not None:
+        filtro["_id"] = {"$gt": last_id}
+    return filtro
+
+def puntuar_lote(docs: list, version: str) -> list:
+    """Calcula los niveles nuevos de un lote y devuelve las operaciones de bulk_write"""
+    features = [
+        scoring.features_desde_promedios(d.get("emotion_averages"), d.get("negative_ratio"))
+        for d in docs
+    ]
+    # UNA predicción para todo el lote
+    niveles_faciales = scoring.predecir_niveles(features)
+
+    ahora = datetime.utcnow()
+    operaciones = []
+    for doc, nivel_facial in zip(docs, niveles_faciales):
+        pss_level = doc.get("pss_level") or scoring.categorize_pss(doc.get("pss_score", 0))
+        operaciones.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {
+                "facial_level": nivel_facial,
+                "final_stress_level": scoring.fusion_algoritmo(pss_level, nivel_facial),
+                "model_version": version,
+                "rescored_at": ahora,
+            }}
+        ))
+    return operaciones
+
+def rescore_partition(partition: int = 0, partitions: int = 1,
+                      chunk_size: int = CHUNK_SIZE, pause: float = 0.0) -> int:
+    """
+    Re-puntúa una partición por bloques de 'chunk_size' documentos (orden por _id).
+    'pause' (segundos) deja respirar a Mongo entre bloques para no afectar a la API.
+    Devuelve cuántos documentos se actualizaron.
+    """
+    if not mongo_disponible():
+        print("⚠️ MongoDB NO disponible, no se puede re-puntuar.")
+        return 0
+    if scoring.stress_model is None:
+        print("⚠️ Modelo de IA no cargado, no se puede re-puntuar.")
+        return 0
+
+    version = scoring.MODEL_VERSION
+    evaluaciones = mongo_db["stress_evaluations"]
+    jobs = mongo_db["rescoring_jobs"]
+    job_id = _id_checkpoint(version, partition, partitions)
+
+    # Reanudar desde el último _id confirmado
+    checkpoint = jobs.find_one({"_id": job_id}) or {}
+    last_id = checkpoint.get("last_id")
+    total = checkpoint.get("processed", 0)
+
+    print(f"🔁 Re-scoring partición {partition}/{partitions} con modelo {version} (desde {last_id})")
+
+    while True:
+        docs = list(
+            evaluaciones.find(_filtro_pendientes(version, partition, partitions, last_id), PROYECCION)
+            .sort("_id", 1)
+            .limit(chunk_size)
+        )
+        if not docs:
+            break
+
+        operaciones = puntuar_lote(docs, version)
+        evaluaciones.bulk_write(operaciones, ordered=False)
+
+        last_id = docs[-1]["_id"]
+        total += len(docs)
+        # Los NRC tocados se guardan con el checkpoint: si el job se reanuda, el
+        # backfill final también cubre los bloques de la ejecución anterior
+        nrcs = list({d["nrc"] for d in docs if d.get("nrc")})
+        jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"last_id": last_id, "processed": total, "model_version": version,
+                      "updated_at": datetime.utcnow()},
+             "$addToSet": {"nrcs": {"$each": nrcs}}},
+            upsert=True,
+        )
+        print(f"   partición {partition}: {total} documentos re-puntuados")
+
+        if pause:
+            time.sleep(pause)
+
+    # Los conteos por nivel de 'class_daily_rollups' cambiaron: los regeneramos
+    nrcs = (jobs.find_one({"_id": job_id}) or {}).get("nrcs", [])
+    for nrc in nrcs:
+        rollups.backfill(nrc)
+
+    jobs.update_one({"_id": job_id}, {"$set": {"finished_at": datetime.utcnow()}}, upsert=True)
+    print(f"✅ Partición {partition}/{partitions} terminada: {total} documentos, {len(nrcs)} NRC actualizados")
+    return total
+
+def _rescore_worker(args: tuple) -> int:
+    return rescore_partition(*args)
+
+def rescore_all(workers: int = 1, chunk_size: int = CHUNK_SIZE, pause: float = 0.0) -> int:
+    """Lanza una partición por proceso. Se usa 'spawn' para que cada proceso abra su propio MongoClient."""
+    if workers <= 1:
+        return rescore_partition(0, 1, chunk_size, pause)
+
+    ctx = multiprocessing.get_context("spawn")
+    tareas = [(p, workers, chunk_size, pause) for p in range(workers)]
+    with ctx.Pool(processes=workers) as pool:
+        return sum(pool.map(_rescore_worker, tareas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-puntúa evaluaciones históricas con el modelo actual")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos en paralelo (una partición cada uno)")
+    parser.add_argument("--partition", type=int, default=None, help="Ejecutar solo esta partición")
+    parser.add_argument("--partitions", type=int, default=1, help="Total de particiones (con --partition)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="Segundos de espera entre bloques")
+    args = parser.parse_args()
+
+    if args.partition is not None:
+        rescore_partition(args.partition, args.partitions, args.chunk_size, args.pause)
+    else:
+        rescore_all(args.workers, args.chunk_size, args.pause)
+
+if __name__ == "__main__":
+    main()
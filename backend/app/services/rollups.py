@@ -0,0 +1,163 @@
+# app/services/rollups.py
+"""
+Resúmenes diarios por NRC para las tendencias del dashboard docente.
+
+Cada documento de 'class_daily_rollups' guarda, para un NRC y un día (UTC):
+conteo por nivel final, total, y sumas de pss_score / negative_ratio (las medias
+se calculan al leer). Se actualiza de forma incremental en cada /pss/submit.
+
+El job de re-scoring regenera solo los NRC que toca. Backfill manual (desde backend/),
+p. ej. la primera vez:
+    python -m app.services.rollups backfill
+    python -m app.services.rollups backfill --nrc 12345
+"""
+import argparse
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.database.mongo import mongo_db, mongo_disponible
+
+ROLLUPS = "class_daily_rollups"
+NIVELES = ["Bajo", "Medio", "Alto"]
+
+
+def _dia(fecha: datetime) -> str:
+    return fecha.strftime("%Y-%m-%d")
+
+def _nivel_normalizado(raw_level) -> str:
+    # Misma regla que el backfill ($trim + $toLower): " medio " y "Medio" son el mismo nivel
+    level_norm = str(raw_level or "").strip().lower()
+    for nivel in NIVELES:
+        if level_norm == nivel.lower():
+            return nivel
+    return None
+
+def ensure_rollup_indexes():
+    if not mongo_disponible():
+        return
+    mongo_db[ROLLUPS].create_index([("nrc", ASCENDING), ("day", ASCENDING)])
+
+def _incrementos(evaluation_doc: dict) -> dict:
+    incrementos = {
+        "total": 1,
+        "pss_score_sum": evaluation_doc.get("pss_score", 0),
+        "negative_ratio_sum": float(evaluation_doc.get("negative_ratio") or 0.0),
+    }
+    nivel = _nivel_normalizado(evaluation_doc.get("final_stress_level"))
+    if nivel:
+        incrementos[f"counts.{nivel}"] = 1
+    return incrementos
+
+def _upsert_rollup(nrc: str, dia: str, incrementos: dict) -> UpdateOne:
+    return UpdateOne(
+        {"_id": f"{nrc}:{dia}"},
+        {
+            "$inc": incrementos,
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"nrc": nrc, "day": dia},
+        },
+        upsert=True,
+    )
+
+def registrar_evaluacion(evaluation_doc: dict):
+    """Suma UNA evaluación al rollup de su NRC y día (upsert + $inc, atómico)"""
+    registrar_evaluaciones([evaluation_doc])
+
+def registrar_evaluaciones(evaluation_docs: list):
+    """Suma muchas evaluaciones: se acumulan por NRC y día y se escriben con un solo bulk_write"""
+    if not mongo_disponible():
+        return
+    acumulado = {}
+    for doc in evaluation_docs:
+        nrc = doc.get("nrc")
+        if not nrc:
+            continue
+        clave = (nrc, _dia(doc.get("created_at") or datetime.utcnow()))
+        total = acumulado.setdefault(clave, {})
+        for campo, valor in _incrementos(doc).items():
+            total[campo] = total.get(campo, 0) + valor
+
+    if acumulado:
+        mongo_db[ROLLUPS].bulk_write(
+            [_upsert_rollup(nrc, dia, inc) for (nrc, dia), inc in acumulado.items()],
+            ordered=False,
+        )
+
+def backfill(nrc: str = None):
+    """Recalcula los rollups desde 'stress_evaluations' en una sola agregación ($merge)"""
+    if not mongo_disponible():
+        print("⚠️ MongoDB NO disponible, no se puede generar el backfill.")
+        return
+
+    match = {"nrc": nrc} if nrc else {"nrc": {"$nin": [None, ""]}}
+
+    def contar(nivel):
+        # Misma regla que _nivel_normalizado: sin espacios y sin distinguir mayúsculas
+        nivel_db = {"$toLower": {"$trim": {"input": {"$ifNull": ["$final_stress_level", ""]}}}}
+        return {"$sum": {"$cond": [{"$eq": [nivel_db, nivel.lower()]}, 1, 0]}}
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "nrc": "$nrc",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+            },
+            "total": {"$sum": 1},
+            "pss_score_sum": {"$sum": {"$ifNull": ["$pss_score", 0]}},
+            "negative_ratio_sum": {"$sum": {"$ifNull": ["$negative_ratio", 0]}},
+            **{f"count_{n}": contar(n) for n in NIVELES},
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.nrc", ":", "$_id.day"]},
+            "nrc": "$_id.nrc",
+            "day": "$_id.day",
+            "total": 1,
+            "pss_score_sum": 1,
+            "negative_ratio_sum": 1,
+            "counts": {n: f"$count_{n}" for n in NIVELES},
+            "updated_at": "$$NOW",
+        }},
+        {"$merge": {"into": ROLLUPS, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+    mongo_db["stress_evaluations"].aggregate(pipeline, allowDiskUse=True)
+    ensure_rollup_indexes()
+    print(f"✅ Backfill de rollups terminado ({'NRC ' + nrc if nrc else 'todos los NRC'})")
+
+def obtener_tendencia(nrc: str, desde: str = None, hasta: str = None) -> list:
+    """Serie diaria de un NRC leída solo de los rollups (sin tocar 'stress_evaluations')"""
+    filtro = {"nrc": nrc}
+    rango = {}
+    if desde: rango["$gte"] = desde
+    if hasta: rango["$lte"] = hasta
+    if rango: filtro["day"] = rango
+
+    serie = []
+    for r in mongo_db[ROLLUPS].find(filtro).sort("day", 1):
+        total = r.get("total", 0)
+        counts = r.get("counts", {})
+        serie.append({
+            "date": r["day"],
+            "total": total,
+            "Bajo": counts.get("Bajo", 0),
+            "Medio": counts.get("Medio", 0),
+            "Alto": counts.get("Alto", 0),
+            "mean_pss_score": round(r.get("pss_score_sum", 0) / total, 2) if total else 0,
+            "mean_negative_ratio": round(r.get("negative_ratio_sum", 0) * 100 / total, 2) if total else 0,
+        })
+    return serie
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollups diarios por NRC")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--nrc", default=None, help="Solo este NRC")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill(args.nrc)
+
+if __name__ == "__main__":
+    main()
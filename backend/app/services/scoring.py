@@ -0,0 +1,134 @@
+# app/services/scoring.py
+import hashlib
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- MODELO DE IA ---
+# Buscamos el archivo .pkl en la carpeta 'app/models' (se puede sobreescribir con STRESS_MODEL_PATH)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Sube un nivel a 'app'
+MODEL_PATH = os.getenv("STRESS_MODEL_PATH", os.path.join(BASE_DIR, "models", "stress_model.pkl"))
+
+# Importante: El orden de columnas debe ser IGUAL al entrenamiento (ver schemas/train_model.py)
+COLS_MODELO = [
+    'neutral_avg', 'happiness_avg', 'sadness_avg', 'anger_avg',
+    'fear_avg', 'disgust_avg', 'surprise_avg', 'negative_ratio'
+]
+
+# Nombres en Mongo (frames de la cámara) -> nombres que espera el modelo
+MAPA_EMOCIONES = {
+    'neutral': 'neutral_avg', 'happy': 'happiness_avg', 'sad': 'sadness_avg',
+    'angry': 'anger_avg', 'fearful': 'fear_avg', 'disgusted': 'disgust_avg',
+    'surprised': 'surprise_avg'
+}
+
+
+def _version_del_modelo(path: str) -> str:
+    """Identificador corto del modelo: STRESS_MODEL_VERSION o hash del .pkl"""
+    version = os.getenv("STRESS_MODEL_VERSION")
+    if version:
+        return version
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloque)
+    return sha.hexdigest()[:12]
+
+
+# Variables globales para el modelo
+stress_model = None
+MODEL_VERSION = None
+
+try:
+    # Los workers comparten el modelo porque gunicorn lo carga en el maestro (preload_app)
+    # y, tras fork(), sus páginas se comparten por copy-on-write; gc.freeze() evita que el
+    # GC las toque y las duplique (ver gunicorn.conf.py). mmap_mode="r" solo ayuda a los
+    # estimadores que guardan arrays de numpy normales: los árboles del RandomForest se
+    # reconstruyen al deserializar y sus buffers se copian igual.
+    stress_model = joblib.load(MODEL_PATH, mmap_mode="r")
+    MODEL_VERSION = _version_del_modelo(MODEL_PATH)
+    print(f"✅ Cerebro Digital (IA) cargado desde: {MODEL_PATH} (versión {MODEL_VERSION})")
+except Exception as e:
+    print(f"⚠️ ADVERTENCIA: No se pudo cargar el modelo de IA. Ruta buscada: {MODEL_PATH}")
+    print(f"   Error: {e}")
+    # El sistema funcionará, pero solo con el cuestionario (modo fallback)
+
+
+# --- FUNCIONES DE PUNTUACIÓN ---
+
+def categorize_pss(score: int) -> str:
+    """Clasificación estándar del PSS-10"""
+    if score <= 13: return "bajo"
+    elif score <= 26: return "medio"
+    else: return "alto"
+
+def nivel_facial_fallback(negative_ratio: float) -> str:
+    """Nivel facial por umbrales cuando no hay modelo de IA"""
+    if negative_ratio > 0.4: return "alto"
+    elif negative_ratio > 0.15: return "medio"
+    else: return "bajo"
+
+def fusion_algoritmo(nivel_pss_txt: str, nivel_facial_txt: str) -> str:
+    """Algoritmo de Fusión 60/40 (Test vs Cara)"""
+    mapa_valor = {"bajo": 1, "medio": 2, "alto": 3}
+    mapa_texto = {1: "Bajo", 2: "Medio", 3: "Alto"}
+
+    val_pss = mapa_valor.get(nivel_pss_txt, 1)
+    # Si la IA falló o dio error, asumimos neutro (1) o seguimos al PSS
+    val_face = mapa_valor.get(nivel_facial_txt, val_pss)
+
+    # FÓRMULA MATEMÁTICA
+    # 60% PSS (Validado científicamente) + 40% IA (Experimental)
+    score_final = (val_pss * 0.6) + (val_face * 0.4)
+
+    # Redondeo simple (1.6 -> 2, 1.4 -> 1)
+    resultado_num = int(round(score_final))
+
+    return mapa_texto.get(resultado_num, "Medio")
+
+def fusion_vectorizada(niveles_pss: list, niveles_faciales: list) -> list:
+    """fusion_algoritmo para muchas evaluaciones a la vez (mismas reglas, en numpy)"""
+    mapa_valor = {"bajo": 1, "medio": 2, "alto": 3}
+    mapa_texto = np.array(["Medio", "Bajo", "Medio", "Alto"])
+
+    val_pss = np.array([mapa_valor.get(n, 1) for n in niveles_pss])
+    val_face = np.array([mapa_valor.get(n, 0) for n in niveles_faciales])
+    # Si la IA falló o dio error, seguimos al PSS
+    val_face = np.where(val_face == 0, val_pss, val_face)
+
+    # 60% PSS + 40% IA; np.rint redondea igual que round() (mitades al par)
+    resultado_num = np.rint(val_pss * 0.6 + val_face * 0.4).astype(int)
+
+    return [str(t) for t in mapa_texto[resultado_num]]
+
+def features_desde_promedios(emotion_averages: dict, negative_ratio: float) -> dict:
+    """Reconstruye el vector del modelo a partir de 'emotion_averages' guardado en Mongo"""
+    features = {}
+    for k_mongo, k_model in MAPA_EMOCIONES.items():
+        features[k_model] = (emotion_averages or {}).get(k_mongo, 0.0)
+    features['negative_ratio'] = negative_ratio or 0.0
+    return features
+
+def predecir_niveles(lista_features: list) -> list:
+    """
+    Predicción en lote: UNA llamada a predict() para muchas filas.
+    Devuelve una lista de niveles ("bajo"/"medio"/"alto") del mismo largo.
+    """
+    if not lista_features:
+        return []
+    if stress_model is None:
+        return [nivel_facial_fallback(f.get('negative_ratio', 0.0)) for f in lista_features]
+
+    df_input = pd.DataFrame(lista_features)
+    # Reordenar y asegurar que estén todas las columnas (rellenar con 0 si falta)
+    for col in COLS_MODELO:
+        if col not in df_input.columns:
+            df_input[col] = 0.0
+    df_input = df_input[COLS_MODELO].fillna(0.0)
+
+    return [str(p) for p in stress_model.predict(df_input)]
@@ -0,0 +1,138 @@
+# app/services/ws_manager.py
+"""
+Gestor de conexiones WebSocket de /ws/emotions.
+
+- Registra cada conexión viva y la limpia al desconectarse (sin sockets huérfanos).
+- Rechaza conexiones nuevas por encima de WS_MAX_CONNECTIONS (cierre 1013).
+- Tarea de heartbeat: manda {"type": "ping"} cada WS_PING_INTERVAL segundos y
+  cierra las conexiones sin mensajes durante WS_IDLE_TIMEOUT segundos.
+- Estadísticas por conexión (frames, fps, bytes, memoria aproximada) en /ws/stats.
+"""
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from fastapi import WebSocket
+
+load_dotenv()
+
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "500"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+
+
+class ConexionWS:
+    __slots__ = ("id", "websocket", "connected_at", "last_seen", "frames", "bytes_in",
+                 "fps", "last_frame_at")
+
+    def __init__(self, id: int, websocket: WebSocket):
+        ahora = time.monotonic()
+        self.id = id
+        self.websocket = websocket
+        self.connected_at = ahora
+        self.last_seen = ahora
+        self.frames = 0
+        self.bytes_in = 0
+        self.fps = 0.0
+        self.last_frame_at = None
+
+    def memoria_aproximada(self) -> int:
+        """Bytes del estado que guardamos por conexión (objeto + scope ASGI)"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(v) for v in self.websocket.scope.values())
+
+    def stats(self, ahora: float) -> dict:
+        return {
+            "id": self.id,
+            "connected_s": round(ahora - self.connected_at, 1),
+            "idle_s": round(ahora - self.last_seen, 1),
+            "frames": self.frames,
+            "fps": round(self.fps, 2),
+            "bytes_in": self.bytes_in,
+            "approx_memory_bytes": self.memoria_aproximada(),
+        }
+
+
+class ConnectionManager:
+    def __init__(self, max_connections: int, idle_timeout: float, ping_interval: float):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.active = {}
+        self._ids = itertools.count(1)
+        self.counters = {"accepted": 0, "rejected_full": 0, "evicted_idle": 0, "closed": 0}
+
+    async def connect(self, websocket: WebSocket):
+        """Acepta la conexión y la registra; devuelve None si se rechazó por límite"""
+        await websocket.accept()
+        if len(self.active) >= self.max_connections:
+            self.counters["rejected_full"] += 1
+            await websocket.close(code=1013, reason="too many connections")
+            return None
+
+        conexion = ConexionWS(next(self._ids), websocket)
+        self.active[conexion.id] = conexion
+        self.counters["accepted"] += 1
+        return conexion
+
+    def disconnect(self, conexion: ConexionWS):
+        if self.active.pop(conexion.id, None) is not None:
+            self.counters["closed"] += 1
+
+    def registrar_mensaje(self, conexion: ConexionWS, nbytes: int, es_frame: bool = True):
+        ahora = time.monotonic()
+        conexion.last_seen = ahora
+        conexion.bytes_in += nbytes
+        if not es_frame:
+            return
+        if conexion.last_frame_at is not None:
+            intervalo = ahora - conexion.last_frame_at
+            if intervalo > 0:
+                # Media móvil exponencial de frames por segundo
+                conexion.fps = 0.8 * conexion.fps + 0.2 * (1.0 / intervalo)
+        conexion.last_frame_at = ahora
+        conexion.frames += 1
+
+    async def _cerrar(self, conexion: ConexionWS, code: int, reason: str):
+        try:
+            await conexion.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+        self.disconnect(conexion)
+
+    async def heartbeat_loop(self):
+        """Ping periódico + desalojo de conexiones inactivas o muertas"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            ahora = time.monotonic()
+            for conexion in list(self.active.values()):
+                if ahora - conexion.last_seen > self.idle_timeout:
+                    self.counters["evicted_idle"] += 1
+                    await self._cerrar(conexion, 1001, "idle timeout")
+                    continue
+                try:
+                    await conexion.websocket.send_json({"type": "ping"})
+                except Exception:
+                    # Socket medio abierto: no se puede escribir, lo soltamos
+                    await self._cerrar(conexion, 1011, "heartbeat failed")
+
+    def stats(self) -> dict:
+        ahora = time.monotonic()
+        try:
+            import resource  # Solo POSIX: en Windows no existe
+            # ru_maxrss está en KB en Linux
+            max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            max_rss_kb = None
+        return {
+            **self.counters,
+            "active": len(self.active),
+            "max_connections": self.max_connections,
+            "process_max_rss_kb": max_rss_kb,
+            "connections": [c.stats(ahora) for c in self.active.values()],
+        }
+
+
+ws_manager = ConnectionManager(WS_MAX_CONNECTIONS, WS_IDLE_TIMEOUT, WS_PING_INTERVAL)
@@ -0,0 +1,28 @@
+# backend/gunicorn.conf.py
+# Despliegue multi-worker (desde backend/):
+#     gunicorn app.main:app -c gunicorn.conf.py
+#
+# - preload_app: la app (y el modelo de IA) se importa UNA vez en el proceso maestro;
+#   los workers la heredan con fork() y comparten esa memoria en solo lectura.
+# - post_fork: cada worker crea sus propias conexiones a Postgres y MongoDB.
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+preload_app = True
+
+
+def when_ready(server):
+    # Congelamos los objetos ya creados (modelo incluido) para que el GC de cada worker
+    # no los toque y no se rompa el copy-on-write de esas páginas.
+    gc.freeze()
+
+def post_fork(server, worker):
+    from app.database import connection, mongo
+
+    connection.reset_after_fork()
+    mongo.reset_after_fork()
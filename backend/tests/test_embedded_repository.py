@@ -0,0 +1,104 @@
+# tests/test_embedded_repository.py
+"""
+El backend embebido debe dar los mismos resultados que las agregaciones de Mongo.
+Se ejecuta desde backend/ (mongomock viene en requirements-dev.txt):
+    pip install -r requirements-dev.txt
+    python -m pytest -q tests
+"""
+import threading
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import app.repositories.mongo as mongo_repo
+from app.repositories.embedded import EmbeddedRepository
+from app.repositories.mongo import MongoRepository
+
+INICIO = datetime(2024, 3, 1, 9, 0)
+
+FRAMES = [
+    {"user_id": 1, "session_id": "s1", "emotions": {"neutral": 0.7, "happy": 0.2, "sad": 0.1}},
+    {"user_id": 1, "session_id": "s1", "emotions": {"neutral": 0.3, "angry": 0.5, "fearful": 0.2}},
+    {"user_id": 1, "session_id": "s1", "emotions": {"happy": 0.95, "disgusted": 0.05}},
+    {"user_id": 2, "session_id": "s2", "emotions": {"sad": 0.6, "surprised": 0.4}},
+    {"user_id": 3, "session_id": "s3", "emotions": {}},
+]
+
+EVALUACIONES = [
+    # (user_id, nrc, nivel, minutos desde INICIO)
+    (1, "100", "Bajo", 0),
+    (1, "100", "Alto", 30),
+    (1, "200", "Medio", 10),
+    (2, "100", "Medio", 5),
+    (2, "100", "Bajo", 1),
+    (3, "200", "Alto", 20),
+    (4, "", "Alto", 40),
+    (5, None, "Bajo", 50),
+]
+
+
+@pytest.fixture
+def repos(monkeypatch):
+    db = mongomock.MongoClient()["stress_detector"]
+    monkeypatch.setattr(mongo_repo, "mongo_db", db)
+    mongo, embebido = MongoRepository(), EmbeddedRepository(":memory:")
+
+    for i, frame in enumerate(FRAMES):
+        for repo in (mongo, embebido):
+            repo.insert_frame({**frame, "timestamp": float(i), "created_at": INICIO})
+        # Los frames del WebSocket no cuentan en las estadísticas de la sesión
+        for repo in (mongo, embebido):
+            repo.insert_frame({**frame, "emotions": {"angry": 1.0}, "created_at": INICIO}, True)
+
+    docs = [
+        {"user_id": u, "session_id": f"e{i}", "nrc": nrc, "final_stress_level": nivel,
+         "created_at": INICIO + timedelta(minutes=m)}
+        for i, (u, nrc, nivel, m) in enumerate(EVALUACIONES)
+    ]
+    mongo.insert_evaluations([dict(d) for d in docs])
+    embebido.insert_evaluations([dict(d) for d in docs])
+    return mongo, embebido
+
+
+def _ordenar(filas):
+    return sorted(filas, key=lambda r: (r["user_id"], str(r["nrc"])))
+
+
+def test_session_stats_igual_que_mongo(repos):
+    mongo, embebido = repos
+    ids = ["s1", "s2", "s3", "no-existe"]
+    esperado, obtenido = mongo.session_stats(ids), embebido.session_stats(ids)
+
+    assert set(obtenido) == set(esperado) == {"s1", "s2", "s3"}
+    for sesion, (promedios, ratio) in esperado.items():
+        assert obtenido[sesion][0] == pytest.approx(promedios)
+        assert obtenido[sesion][1] == pytest.approx(ratio)
+
+
+@pytest.mark.parametrize("filtro", [
+    {},
+    {"nrcs": ["100"]},
+    {"nrcs": ["100", "200"]},
+    {"user_ids": [1, 2]},
+    {"nrcs": ["200"], "user_ids": [1, 3]},
+])
+def test_latest_per_student_igual_que_mongo(repos, filtro):
+    mongo, embebido = repos
+    assert _ordenar(embebido.latest_per_student(**filtro)) == _ordenar(mongo.latest_per_student(**filtro))
+
+
+def test_last_evaluation_at_igual_que_mongo(repos):
+    mongo, embebido = repos
+    assert embebido.last_evaluation_at(nrc="100") == mongo.last_evaluation_at(nrc="100")
+    assert embebido.last_evaluation_at(user_id=1) == mongo.last_evaluation_at(user_id=1)
+    assert embebido.last_evaluation_at(nrc="sin-datos") is None
+
+
+def test_memoria_compartida_entre_hilos(repos):
+    _, embebido = repos
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(embebido.latest_per_student(nrcs=["100"])))
+    hilo.start()
+    hilo.join()
+    assert len(resultado[0]) == 2
@@ -39,6 +39,18 @@ export const connectWS = () => {
         console.log("🟢 WebSocket conectado a:", WS_URL);
     };
 
+    // Heartbeat del backend: respondemos al ping para que no nos cierre por inactividad
+    ws.onmessage = (msg) => {
+        try {
+            const data = JSON.parse(msg.data);
+            if (data.type === "ping") {
+                ws.send(JSON.stringify({ type: "pong" }));
+            }
+        } catch {
+            // Mensaje que no es JSON: lo ignoramos
+        }
+    };
+
     ws.onclose = () => {
         console.log("🔴 WebSocket desconectado");
     };